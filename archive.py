@@ -0,0 +1,153 @@
+import os
+import gzip
+import json
+from collections import OrderedDict
+from models import Quote
+
+ARCHIVE_DIR = 'archive'
+INDEX_FILE = 'index.json'
+
+# Decoded month segments kept in memory for /myquotes paging and PDF downloads
+SEGMENT_CACHE_SIZE = 2
+
+
+def _counter(quote_number):
+    return int(quote_number.split('-', 1)[1])
+
+
+class QuoteArchive:
+    """Closed quotes moved out of memory into one gzipped JSON-lines file per month.
+
+    index.json holds per month the number of quotes, the range of quote counters and the
+    quote count per user and status. Counting a user's quotes only needs the index; a segment
+    is read only when one of its quotes is asked for.
+    """
+
+    def __init__(self, directory=ARCHIVE_DIR):
+        self.directory = directory
+        self.index_file = os.path.join(directory, INDEX_FILE)
+        self.months = {}
+        if os.path.exists(self.index_file):
+            with open(self.index_file, 'r', encoding='utf-8') as f:
+                self.months = json.load(f)['months']
+        self._cache = OrderedDict()
+
+    def _segment_file(self, month):
+        return os.path.join(self.directory, f'quotes-{month}.jsonl.gz')
+
+    def _read_segment(self, month):
+        """Yield the quotes of a month in counter order, streaming from disk."""
+        path = self._segment_file(month)
+        if not os.path.exists(path):
+            return
+        with gzip.open(path, 'rt', encoding='utf-8') as f:
+            for line in f:
+                yield Quote.from_dict(json.loads(line))
+
+    def _segment(self, month):
+        segment = self._cache.get(month)
+        if segment is None:
+            segment = {quote.quote_number: quote for quote in self._read_segment(month)}
+            self._cache[month] = segment
+            if len(self._cache) > SEGMENT_CACHE_SIZE:
+                self._cache.popitem(last=False)
+        else:
+            self._cache.move_to_end(month)
+        return segment
+
+    def add(self, quotes):
+        """Write quotes into their month segments and update the index.
+
+        Each affected segment is rewritten to a temp file and swapped in, so adding the same
+        quote twice (e.g. after a crash before the hot store was compacted) keeps one copy.
+        """
+        self.use_index(self.write(quotes))
+
+    def write(self, quotes):
+        """The file half of add(), safe to run in a worker thread; returns the new index for use_index()."""
+        os.makedirs(self.directory, exist_ok=True)
+        months = dict(self.months)
+        by_month = {}
+        for quote in quotes:
+            by_month.setdefault(quote.created_at[:7], []).append(quote)
+        for month, new_quotes in by_month.items():
+            merged = {quote.quote_number: quote for quote in self._read_segment(month)}
+            merged.update((quote.quote_number, quote) for quote in new_quotes)
+            ordered = sorted(merged.values(), key=lambda q: _counter(q.quote_number))
+            tmp_file = self._segment_file(month) + '.tmp'
+            with gzip.open(tmp_file, 'wt', encoding='utf-8') as f:
+                for quote in ordered:
+                    f.write(json.dumps(quote.to_dict(), separators=(',', ':')) + '\n')
+            with open(tmp_file, 'rb') as f:
+                os.fsync(f.fileno())
+            os.replace(tmp_file, self._segment_file(month))
+            users = {}
+            for quote in ordered:
+                statuses = users.setdefault(str(quote.user_id), {})
+                statuses[quote.status] = statuses.get(quote.status, 0) + 1
+            months[month] = {
+                'count': len(ordered),
+                'first': _counter(ordered[0].quote_number),
+                'last': _counter(ordered[-1].quote_number),
+                'users': users,
+            }
+        tmp_index = self.index_file + '.tmp'
+        with open(tmp_index, 'w', encoding='utf-8') as f:
+            json.dump({'months': months}, f, separators=(',', ':'), sort_keys=True)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_index, self.index_file)
+        return months
+
+    def use_index(self, months):
+        """Switch to an index returned by write(); cached segments may predate it."""
+        self.months = months
+        self._cache.clear()
+
+    def get(self, quote_number):
+        counter = _counter(quote_number)
+        for month, entry in self.months.items():
+            if entry['first'] <= counter <= entry['last']:
+                quote = self._segment(month).get(quote_number)
+                if quote is not None:
+                    return quote
+        return None
+
+    def _user_count(self, month, user_id, status):
+        statuses = self.months[month]['users'].get(str(user_id), {})
+        return statuses.get(status, 0) if status is not None else sum(statuses.values())
+
+    def count_by_user(self, user_id, status=None):
+        return sum(self._user_count(month, user_id, status) for month in self.months)
+
+    def list_by_user(self, user_id, status=None, offset=0, limit=None):
+        """A user's archived quotes, newest first. Months before the offset are skipped using the index."""
+        quotes = []
+        for month in sorted(self.months, reverse=True):
+            count = self._user_count(month, user_id, status)
+            if count == 0:
+                continue
+            if offset >= count:
+                offset -= count
+                continue
+            month_quotes = [
+                q for q in reversed(list(self._segment(month).values()))
+                if q.user_id == user_id and (status is None or q.status == status)
+            ]
+            quotes.extend(month_quotes[offset:])
+            offset = 0
+            if limit is not None and len(quotes) >= limit:
+                return quotes[:limit]
+        return quotes
+
+    def iter_quotes(self, status=None, since=None, before=None):
+        """Archived quotes oldest first, streamed segment by segment without caching them."""
+        for month in sorted(self.months):
+            if (since is not None and month < since[:7]) or (before is not None and month > before[:7]):
+                continue
+            for quote in self._read_segment(month):
+                if status is not None and quote.status != status:
+                    continue
+                if (since is not None and quote.created_at < since) or (before is not None and quote.created_at >= before):
+                    continue
+                yield quote
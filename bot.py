@@ -1,7 +1,12 @@
+import time
+# Before the other imports, so the reported startup time includes them
+STARTED = time.perf_counter()
 import os
-import json
-from datetime import datetime
-from telegram import Update, ReplyKeyboardMarkup, ReplyKeyboardRemove, InlineKeyboardMarkup, InlineKeyboardButton
+import asyncio
+import tempfile
+from datetime import datetime, timedelta
+from decimal import InvalidOperation
+from telegram import Bot, Update, ReplyKeyboardMarkup, ReplyKeyboardRemove, InlineKeyboardMarkup, InlineKeyboardButton
 from telegram.ext import (
     Application,
     CommandHandler,
@@ -11,16 +16,27 @@ from telegram.ext import (
     CallbackQueryHandler,
     filters
 )
-from reportlab.lib import colors
-from reportlab.lib.pagesizes import A4
-from reportlab.lib.styles import getSampleStyleSheet, ParagraphStyle
-from reportlab.lib.units import inch
-from reportlab.platypus import SimpleDocTemplate, Table, TableStyle, Paragraph, Spacer, Image, HRFlowable
-from reportlab.lib.enums import TA_CENTER, TA_LEFT, TA_RIGHT
-from io import BytesIO
+from telegram.error import BadRequest
+from telegram.request import HTTPXRequest
+from bulk import MAX_BULK_FILE_BYTES, BulkUploadError, parse_bulk_quotes, read_rows, zip_pdfs
+from expiry import ExpiryScheduler
+from export import EXPORT_WRITERS
+from fanout import GLOBAL_RATE, SendLimiter, fan_out, send_with_retry
+from jobs import BULK, JobQueue, JobQueueFull
+from metrics import InstrumentedRequest, instrumented, metrics, metrics_routes
+from pdf_cache import pdf_key
+from rendering import PDF_WARMUP, quote_pdf_bytes, shutdown_renderer, warm_renderer
+from stats import cents_to_birr, litres_to_m3
+from quickpi import QUICKPI_EXAMPLE, QuickQuoteError, parse_quick_quote
+from persistence import CONVERSATIONS_FILE, ConversationPersistence
+from models import Quote, parse_amount, parse_extras, parse_grades
+from storage import open_store, quote_numbers_between
+from webhook import run_webhook, serve_http
+from workers import run_workers
 
 # Conversation states
-(CUSTOMER, LOCATION_INPUT, GRADES, PRICE, QUANTITY, EXTRAS, CONFIRM) = range(7)
+(CUSTOMER, LOCATION_INPUT, GRADES, PRICE, QUANTITY, EXTRAS, CONFIRM, QUICK) = range(8)
+STATE_NAMES = ['customer', 'location', 'grades', 'price', 'quantity', 'extras', 'confirm', 'quick']
 
 # Concrete grades
 GRADES_LIST = ['C-15', 'C-20', 'C-25', 'C-30', 'C-35', 'C-37', 'C-40', 'C-45', 'C-50']
@@ -28,261 +44,86 @@ GRADES_LIST = ['C-15', 'C-20', 'C-25', 'C-30', 'C-35', 'C-37', 'C-40', 'C-45', '
 # Extra services
 EXTRAS_LIST = ['Elephant pump', 'Vibrator', 'Skip', 'None']
 
+# Bot token
+BOT_TOKEN = os.environ.get('BOT_TOKEN', "8513160001:AAELK8YtZxL34U2tWrNsXLOGooJEVSWqKWI")
+# Bot API endpoint override, e.g. a local stub for offline testing
+TELEGRAM_API_URL = os.environ.get('TELEGRAM_API_URL')
+
+# Serving mode: 'polling' (getUpdates) or 'webhook' (embedded HTTP server)
+BOT_MODE = os.environ.get('BOT_MODE', 'polling')
+# Checked against the X-Telegram-Bot-Api-Secret-Token header of every POST
+WEBHOOK_SECRET = os.environ.get('WEBHOOK_SECRET')
+# Without a secret anyone reaching the port could post updates as an admin, so the server then
+# only listens on loopback, for feeding recorded updates by hand
+WEBHOOK_HOST = os.environ.get('WEBHOOK_HOST', '0.0.0.0') if WEBHOOK_SECRET else '127.0.0.1'
+WEBHOOK_PORT = int(os.environ.get('PORT', '8443'))
+WEBHOOK_PATH = os.environ.get('WEBHOOK_PATH', '/telegram')
+# Public URL registered with Telegram at startup; leave unset to feed updates by hand
+WEBHOOK_URL = os.environ.get('WEBHOOK_URL')
+# Worker processes in webhook mode; more than one needs QUOTE_STORE=sqlite
+BOT_WORKERS = int(os.environ.get('BOT_WORKERS', '1'))
+
 # Admin user IDs
 ADMIN_IDS = [5613539602]
 
-# Data persistence
-DATA_FILE = 'bot_data.json'
+# /myquotes paging
+MYQUOTES_PAGE_SIZE = 5
+MYQUOTES_FILTERS = ['all', 'pending', 'approved', 'rejected', 'expired']
 
-def load_data():
-    if os.path.exists(DATA_FILE):
-        with open(DATA_FILE, 'r') as f:
-            return json.load(f)
-    return {'quote_counter': 100, 'quotes': {}}
+# /pending review list for admins
+PENDING_PAGE_SIZE = 8
 
-def save_data(data):
-    with open(DATA_FILE, 'w') as f:
-        json.dump(data, f, indent=2)
+# Days listed by /stats
+STATS_DAYS = 7
 
-bot_data = load_data()
+# Data persistence: 'json' (snapshot + journal) or 'sqlite'
+QUOTE_STORE = os.environ.get('QUOTE_STORE', 'json')
 
-def generate_pdf(pi_data):
-    buffer = BytesIO()
-    pdf = SimpleDocTemplate(buffer, pagesize=A4, rightMargin=40, leftMargin=40, topMargin=25, bottomMargin=25)
-    elements = []
-    styles = getSampleStyleSheet()
-    
-    title_style = ParagraphStyle('CustomTitle', parent=styles['Heading1'], fontSize=18, textColor=colors.HexColor('#1a3a6b'), spaceAfter=8, alignment=TA_CENTER, fontName='Helvetica-Bold')
-    header_style = ParagraphStyle('Header', parent=styles['Normal'], fontSize=7, textColor=colors.HexColor('#666666'), alignment=TA_LEFT)
-    
-    # Header with company info and logo
-    company_info = """
-    <b>CoBuilt Solutions</b><br/>
-    Addis Ababa, Ethiopia<br/>
-    Phone: +251911246502<br/>
-    +251911246820<br/>
-    Email: CoBuilt@CoBuilt.com<br/>
-    Web: www.CoBuilt.com
-    """
-    
-    # Try to add logo in top right corner
-    try:
-        logo = Image('logo.png', width=1*inch, height=1*inch)
-        logo.hAlign = 'RIGHT'
-        
-        # Create table to position company info and logo side by side
-        header_table = Table([[Paragraph(company_info, header_style), logo]], colWidths=[4*inch, 3*inch])
-        header_table.setStyle(TableStyle([
-            ('VALIGN', (0, 0), (-1, -1), 'TOP'),
-            ('ALIGN', (0, 0), (0, 0), 'LEFT'),
-            ('ALIGN', (1, 0), (1, 0), 'RIGHT'),
-        ]))
-        elements.append(header_table)
-    except:
-        # If logo not found, just add company info
-        elements.append(Paragraph(company_info, header_style))
-    
-    elements.append(Spacer(1, 6))
-    
-    # Add horizontal line after header
-    elements.append(HRFlowable(width="100%", thickness=1.5, color=colors.HexColor('#1a3a6b'), spaceAfter=6))
-    
-    elements.append(Paragraph("CONCRETE QUOTE", title_style))
-    
-    # Add horizontal line after title
-    elements.append(HRFlowable(width="100%", thickness=0.5, color=colors.HexColor('#cccccc'), spaceBefore=2, spaceAfter=6))
-    
-    date_quote = f"<para align=right><b>Date:</b> {datetime.now().strftime('%b %d, %Y')}<br/><b>Quote No:</b> {pi_data['quote_number']}</para>"
-    elements.append(Paragraph(date_quote, styles['Normal']))
-    elements.append(Spacer(1, 6))
-    
-    # Calculate total quantity
-    total_quantity = sum(pi_data['quantity'][g] for g in pi_data['grades'])
-    
-    customer_data = [
-        ['Company:', pi_data['customer'], 'Additional service:', pi_data['extras']],
-        ['Location:', pi_data['location'], 'Payment terms:', '100% advance'],
-        ['Quantity:', f"{total_quantity:,.2f}m³", 'Validity of quote:', 'Valid for 3 days'],
-        ['Concrete Grade:', ', '.join(pi_data['grades']), '', '']
-    ]
-    
-    customer_table = Table(customer_data, colWidths=[1.3*inch, 2*inch, 1.6*inch, 2*inch])
-    customer_table.setStyle(TableStyle([
-        ('FONTNAME', (0, 0), (-1, -1), 'Helvetica'),
-        ('FONTSIZE', (0, 0), (-1, -1), 7),
-        ('FONTNAME', (0, 0), (0, -1), 'Helvetica-Bold'),
-        ('FONTNAME', (2, 0), (2, -1), 'Helvetica-Bold'),
-        ('TEXTCOLOR', (0, 0), (-1, -1), colors.HexColor('#333333')),
-        ('ALIGN', (0, 0), (-1, -1), 'LEFT'),
-        ('VALIGN', (0, 0), (-1, -1), 'TOP'),
-        ('BOTTOMPADDING', (0, 0), (-1, -1), 4),
-        ('LINEBELOW', (0, 0), (-1, -1), 0.5, colors.HexColor('#dddddd')),
-    ]))
-    elements.append(customer_table)
-    elements.append(Spacer(1, 8))
-    
-    # Calculate how many grades - adjust table accordingly
-    num_grades = len(pi_data['grades'])
-    
-    table_data = [['No.', 'Description', 'Grade', 'Quantity', 'Price', 'Total Price']]
-    total_amount = 0
-    for idx, grade in enumerate(pi_data['grades'], 1):
-        unit_price = pi_data['unit_price'][grade]
-        quantity = pi_data['quantity'][grade]
-        line_total = unit_price * quantity
-        total_amount += line_total
-        table_data.append([str(idx), 'Concrete OPC', grade, f"{quantity:,.2f}m³", f"{unit_price:,.2f}", f"{line_total:,.2f}"])
-    
-    # Add subtotal row
-    table_data.append(['', '', '', '', 'Subtotal:', f"{total_amount:,.2f}"])
-    
-    # Calculate VAT (15%)
-    vat_amount = total_amount * 0.15
-    table_data.append(['', '', '', '', 'VAT (15%):', f"{vat_amount:,.2f}"])
-    
-    # Calculate Grand Total
-    grand_total = total_amount + vat_amount
-    table_data.append(['', '', '', '', 'Grand Total:', f"{grand_total:,.2f}"])
-    
-    pricing_table = Table(table_data, colWidths=[0.4*inch, 2.3*inch, 0.7*inch, 0.9*inch, 1.1*inch, 1.4*inch])
-    pricing_table.setStyle(TableStyle([
-        ('BACKGROUND', (0, 0), (-1, 0), colors.HexColor('#d2691e')),
-        ('TEXTCOLOR', (0, 0), (-1, 0), colors.whitesmoke),
-        ('ALIGN', (0, 0), (-1, 0), 'CENTER'),
-        ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
-        ('FONTSIZE', (0, 0), (-1, 0), 8),
-        ('BOTTOMPADDING', (0, 0), (-1, 0), 8),
-        ('TOPPADDING', (0, 0), (-1, 0), 8),
-        ('BACKGROUND', (0, 1), (-1, -4), colors.beige),
-        ('TEXTCOLOR', (0, 1), (-1, -1), colors.HexColor('#333333')),
-        ('ALIGN', (0, 1), (-1, -4), 'CENTER'),
-        ('FONTNAME', (0, 1), (-1, -4), 'Helvetica'),
-        ('FONTSIZE', (0, 1), (-1, -4), 7),
-        ('GRID', (0, 0), (-1, -4), 0.5, colors.HexColor('#999999')),
-        ('VALIGN', (0, 0), (-1, -1), 'MIDDLE'),
-        ('ROWBACKGROUNDS', (0, 1), (-1, -4), [colors.beige, colors.white]),
-        # Subtotal row styling
-        ('SPAN', (0, -3), (3, -3)),
-        ('ALIGN', (4, -3), (-1, -3), 'RIGHT'),
-        ('FONTNAME', (4, -3), (-1, -3), 'Helvetica-Bold'),
-        ('FONTSIZE', (4, -3), (-1, -3), 8),
-        ('LINEABOVE', (0, -3), (-1, -3), 1, colors.HexColor('#999999')),
-        # VAT row styling
-        ('SPAN', (0, -2), (3, -2)),
-        ('ALIGN', (4, -2), (-1, -2), 'RIGHT'),
-        ('FONTNAME', (4, -2), (-1, -2), 'Helvetica'),
-        ('FONTSIZE', (4, -2), (-1, -2), 7),
-        # Grand Total row styling
-        ('SPAN', (0, -1), (3, -1)),
-        ('ALIGN', (4, -1), (-1, -1), 'RIGHT'),
-        ('FONTNAME', (4, -1), (-1, -1), 'Helvetica-Bold'),
-        ('FONTSIZE', (4, -1), (-1, -1), 9),
-        ('LINEABOVE', (0, -1), (-1, -1), 1.5, colors.HexColor('#d2691e')),
-        ('BACKGROUND', (4, -1), (-1, -1), colors.HexColor('#f5f5dc')),
-    ]))
-    elements.append(pricing_table)
-    elements.append(Spacer(1, 6))
-    
-    # Add horizontal line before notes
-    elements.append(HRFlowable(width="100%", thickness=0.5, color=colors.HexColor('#cccccc'), spaceAfter=4))
-    
-    note_style = ParagraphStyle('Note', parent=styles['Normal'], fontSize=6, textColor=colors.HexColor('#666666'))
-    vat_notice = "<para align=left textColor=#666666><i>Note: VAT (15%) has been included in the Grand Total above.</i></para>"
-    elements.append(Paragraph(vat_notice, note_style))
-    
-    discount_notice = "<para align=left textColor=#999999>- As the order volume increases, we can extend a discount accordingly.</para>"
-    elements.append(Paragraph(discount_notice, note_style))
-    elements.append(Spacer(1, 5))
-    
-    # Add horizontal line before terms
-    elements.append(HRFlowable(width="100%", thickness=0.5, color=colors.HexColor('#cccccc'), spaceAfter=4))
-    
-    terms_style = ParagraphStyle('Terms', parent=styles['Normal'], fontSize=7)
-    terms_title = "<para align=left><b>Terms &amp; Conditions</b></para>"
-    elements.append(Paragraph(terms_title, terms_style))
-    elements.append(Spacer(1, 3))
-    
-    terms = """
-    • Delivery Schedule: Within 7–10 working days from confirmation.<br/>
-    • Payment Terms: 100% advance.<br/>
-    • Validity: This quote is valid for 3 days from the date of issue.<br/>
-    • Exclusions: Does not include site preparation, road access issues, or waiting time beyond 1 hour per truck.
-    """
-    elements.append(Paragraph(terms, terms_style))
-    elements.append(Spacer(1, 5))
-    
-    # Add horizontal line before contact info
-    elements.append(HRFlowable(width="100%", thickness=0.5, color=colors.HexColor('#cccccc'), spaceAfter=4))
-    
-    contact_style = ParagraphStyle('Contact', parent=styles['Normal'], fontSize=7)
-    footer_contact = """
-    <para align=left><b>For any clarifications, please contact:</b><br/>
-    Biruk Endale<br/>
-    Chief Operation Officer<br/>
-    CoBuilt Solutions<br/>
-    +251911246502<br/>
-    +251911246520
-    </para>
-    """
-    elements.append(Paragraph(footer_contact, contact_style))
-    elements.append(Spacer(1, 3))
-    
-    try:
-        # Signature with "Approved By:" text - maintaining aspect ratio from uploaded image
-        signature = Image('signature.png', width=3*inch, height=1.75*inch)
-        
-        approved_by_style = ParagraphStyle('ApprovedBy', parent=styles['Normal'], fontSize=8, alignment=TA_RIGHT)
-        approved_by_text = Paragraph("<b>Approved By:</b>", approved_by_style)
-        
-        # Create table with signature and text below it
-        sig_table = Table([[signature], [approved_by_text]], colWidths=[3*inch])
-        sig_table.setStyle(TableStyle([
-            ('VALIGN', (0, 0), (-1, -1), 'MIDDLE'),
-            ('ALIGN', (0, 0), (0, 0), 'RIGHT'),
-            ('ALIGN', (0, 1), (0, 1), 'RIGHT'),
-            ('LEFTPADDING', (0, 0), (-1, -1), 0),
-            ('RIGHTPADDING', (0, 0), (-1, -1), 0),
-            ('BOTTOMPADDING', (0, 0), (-1, -1), 0),
-            ('TOPPADDING', (0, 0), (0, 0), 0),
-            ('TOPPADDING', (0, 1), (0, 1), 2),
-        ]))
-        sig_table.hAlign = 'RIGHT'
-        elements.append(sig_table)
-    except Exception as e:
-        print(f"Could not add signature: {e}")
-    
-    elements.append(Spacer(1, 3))
-    
-    # Add final horizontal line before company footer
-    elements.append(HRFlowable(width="100%", thickness=1.5, color=colors.HexColor('#1a3a6b'), spaceAfter=3))
-    
-    footer_style = ParagraphStyle('Footer', parent=styles['Normal'], fontSize=7)
-    company_footer = "<para align=left><b>A branch of SSara Group</b></para>"
-    elements.append(Paragraph(company_footer, footer_style))
-    
-    pdf.build(elements)
-    buffer.seek(0)
-    return buffer
+store = open_store(QUOTE_STORE)
+# Background task that makes store writes durable, started in post_init
+store_writer = None
+# Loading the remaining quotes and warming the PDF renderer, started in post_init
+startup_tasks = []
+
+# Half-finished quotes are written to disk at most this often (seconds) and at shutdown
+PERSIST_INTERVAL = int(os.environ.get('PERSIST_INTERVAL', '10'))
+
+# Shared by all outgoing fan-outs so they stay within Telegram's flood limits together; with
+# several worker processes each one gets its share of the overall limit
+send_limiter = SendLimiter(global_rate=GLOBAL_RATE / BOT_WORKERS)
+# PDF renders and sends: interactive ahead of bulk, users taking turns, bounded in size
+job_queue = JobQueue()
+
+# Prometheus metrics, served on a local port; 0 turns the endpoint off
+METRICS_HOST = os.environ.get('METRICS_HOST', '127.0.0.1')
+METRICS_PORT = int(os.environ.get('METRICS_PORT', '9464'))
+metrics_server = None
 
 # ---- Handlers ----
 
+@instrumented
 async def start(update: Update, context: CallbackContext):
     user = update.effective_user
     await update.message.reply_text(
         f"👋 Welcome to CoBuilt Solutions PI Bot, {user.first_name}!\n\n"
         f"Commands:\n"
         f"/createpi - Create a new Price Quote\n"
+        f"/quickpi - Create a quote from one message\n"
         f"/myquotes - View your quotes\n"
         f"/cancel - Cancel operation\n"
         f"/help - Show help"
     )
 
+@instrumented
 async def help_command(update: Update, context: CallbackContext):
     await update.message.reply_text(
-        "📖 *How to use this bot:*\n1️⃣ /createpi\n2️⃣ Follow prompts\n3️⃣ Add extras\n4️⃣ Delivery location\n5️⃣ Review & confirm\n6️⃣ Admin approval\n7️⃣ Download PDF",
+        "📖 *How to use this bot:*\n1️⃣ /createpi\n2️⃣ Follow prompts\n3️⃣ Add extras\n4️⃣ Delivery location\n5️⃣ Review & confirm\n6️⃣ Admin approval\n7️⃣ Download PDF\n\n"
+        f"⚡ All in one message: /quickpi {QUICKPI_EXAMPLE}\n\n"
+        "📎 Many quotes at once: send a CSV or XLSX file with the columns customer, location, grade, price, quantity, extras",
         parse_mode='Markdown'
     )
 
+@instrumented
 async def create_pi(update: Update, context: CallbackContext):
     context.user_data.clear()
     context.user_data['pi_data'] = {
@@ -295,6 +136,7 @@ async def create_pi(update: Update, context: CallbackContext):
     await update.message.reply_text("👤 Enter customer/company name:", reply_markup=reply_markup)
     return CUSTOMER
 
+@instrumented
 async def customer_name(update: Update, context: CallbackContext):
     if update.message.text == '❌ Cancel':
         return await cancel(update, context)
@@ -305,6 +147,7 @@ async def customer_name(update: Update, context: CallbackContext):
     await update.message.reply_text("📍 Enter delivery location:", reply_markup=reply_markup)
     return LOCATION_INPUT
 
+@instrumented
 async def location_input(update: Update, context: CallbackContext):
     if update.message.text == '❌ Cancel':
         return await cancel(update, context)
@@ -329,6 +172,7 @@ async def location_input(update: Update, context: CallbackContext):
     )
     return GRADES
 
+@instrumented
 async def quantity_input(update: Update, context: CallbackContext):
     keyboard = [GRADES_LIST[i:i+4] for i in range(0, len(GRADES_LIST), 4)]
     keyboard.append(['⬅️ Back', '❌ Cancel'])
@@ -336,6 +180,7 @@ async def quantity_input(update: Update, context: CallbackContext):
     await update.message.reply_text("🧱 Select concrete grades (comma separated):", reply_markup=reply_markup)
     return GRADES
 
+@instrumented
 async def grades(update: Update, context: CallbackContext):
     if update.message.text == '❌ Cancel':
         return await cancel(update, context)
@@ -346,18 +191,7 @@ async def grades(update: Update, context: CallbackContext):
         await update.message.reply_text("📍 Enter delivery location:", reply_markup=reply_markup)
         return LOCATION_INPUT
     
-    grades_input = update.message.text.replace(' ', '')
-    grades = [g.strip().upper() for g in grades_input.split(',') if g.strip()]
-    
-    # Validate grades
-    valid_grades = []
-    invalid_grades = []
-    for grade in grades:
-        if grade in GRADES_LIST:
-            if grade not in valid_grades:  # Avoid duplicates
-                valid_grades.append(grade)
-        else:
-            invalid_grades.append(grade)
+    valid_grades, invalid_grades = parse_grades(update.message.text, GRADES_LIST)
     
     if invalid_grades:
         keyboard = [GRADES_LIST[i:i+4] for i in range(0, len(GRADES_LIST), 4)]
@@ -389,6 +223,7 @@ async def grades(update: Update, context: CallbackContext):
     await update.message.reply_text(f"💵 Grade: {grade}\nEnter price per m³:", reply_markup=reply_markup)
     return PRICE
 
+@instrumented
 async def price(update: Update, context: CallbackContext):
     if update.message.text == '❌ Cancel':
         return await cancel(update, context)
@@ -419,9 +254,8 @@ async def price(update: Update, context: CallbackContext):
     
     grade = context.user_data['pi_data']['grades'][context.user_data['current_grade_index']]
     try:
-        price_value = float(update.message.text.replace(',', ''))
-        if price_value < 0: raise ValueError()
-        context.user_data['pi_data']['unit_price'][grade] = price_value
+        # Kept as a string so the draft stays JSON-serializable for persistence
+        context.user_data['pi_data']['unit_price'][grade] = str(parse_amount(update.message.text))
     except ValueError:
         keyboard = [['⬅️ Back', '❌ Cancel']]
         reply_markup = ReplyKeyboardMarkup(keyboard, one_time_keyboard=True, resize_keyboard=True)
@@ -433,6 +267,7 @@ async def price(update: Update, context: CallbackContext):
     await update.message.reply_text(f"📏 Grade: {grade}\nEnter quantity in m³:", reply_markup=reply_markup)
     return QUANTITY
 
+@instrumented
 async def quantity(update: Update, context: CallbackContext):
     if update.message.text == '❌ Cancel':
         return await cancel(update, context)
@@ -447,9 +282,7 @@ async def quantity(update: Update, context: CallbackContext):
     
     grade = context.user_data['pi_data']['grades'][context.user_data['current_grade_index']]
     try:
-        quantity_value = float(update.message.text.replace(',', ''))
-        if quantity_value < 0: raise ValueError()
-        context.user_data['pi_data']['quantity'][grade] = quantity_value
+        context.user_data['pi_data']['quantity'][grade] = str(parse_amount(update.message.text))
     except ValueError:
         keyboard = [['⬅️ Back', '❌ Cancel']]
         reply_markup = ReplyKeyboardMarkup(keyboard, one_time_keyboard=True, resize_keyboard=True)
@@ -470,6 +303,7 @@ async def quantity(update: Update, context: CallbackContext):
         await update.message.reply_text("🧰 Select extra services (comma separated) or 'None':", reply_markup=reply_markup)
         return EXTRAS
 
+@instrumented
 async def extras(update: Update, context: CallbackContext):
     if update.message.text == '❌ Cancel':
         return await cancel(update, context)
@@ -483,27 +317,25 @@ async def extras(update: Update, context: CallbackContext):
         await update.message.reply_text(f"📏 Grade: {grade}\nEnter quantity in m³:", reply_markup=reply_markup)
         return QUANTITY
     
-    extras_text = update.message.text.strip()
-    if extras_text.lower() == 'none':
-        context.user_data['pi_data']['extras'] = 'None'
-    else:
-        extras_list = [e.strip() for e in extras_text.split(',') if e.strip().lower() != 'none']
-        context.user_data['pi_data']['extras'] = ', '.join(extras_list) if extras_list else 'None'
-
-    pi_data = context.user_data['pi_data']
-    total_quantity = sum(pi_data['quantity'][g] for g in pi_data['grades'])
-    subtotal = sum(pi_data['unit_price'][g] * pi_data['quantity'][g] for g in pi_data['grades'])
-    vat_amount = subtotal * 0.15
-    total_amount = subtotal + vat_amount
+    context.user_data['pi_data']['extras'] = ', '.join(parse_extras(update.message.text)) or 'None'
+    return await show_draft(update.message, context)
 
-    grades_summary = "\n".join([f"• {g}: {pi_data['unit_price'][g]:,.2f} × {pi_data['quantity'][g]:,.2f}m³ = {pi_data['unit_price'][g]*pi_data['quantity'][g]:,.2f}" for g in pi_data['grades']])
+async def show_draft(message, context: CallbackContext):
+    """Reply with the draft quote and the Submit/Back/Cancel buttons"""
+    try:
+        quote = Quote.from_dict(context.user_data['pi_data'])
+    except InvalidOperation:
+        # Totals beyond Decimal's precision, e.g. from a draft saved before amounts were bounded
+        await message.reply_text("❌ The totals are too large to quote. Use /createpi to start again.", reply_markup=ReplyKeyboardRemove())
+        return ConversationHandler.END
+    grades_summary = "\n".join([f"• {item.grade}: {item.unit_price:,.2f} × {item.quantity:,.2f}m³ = {item.total:,.2f}" for item in quote.items])
     draft = (
-        f"📋 *DRAFT QUOTE*\n\n👤 Customer: {pi_data['customer']}\n📍 Location: {pi_data['location']}\n📊 Total Quantity: {total_quantity:,.2f}m³\n\n"
+        f"📋 *DRAFT QUOTE*\n\n👤 Customer: {quote.customer}\n📍 Location: {quote.location}\n📊 Total Quantity: {quote.total_quantity:,.2f}m³\n\n"
         f"🧱 Grades & Pricing:\n{grades_summary}\n\n"
-        f"💰 Subtotal: {subtotal:,.2f} Birr\n"
-        f"📊 VAT (15%): {vat_amount:,.2f} Birr\n"
-        f"💵 *Grand Total: {total_amount:,.2f} Birr*\n\n"
-        f"🧰 Extras: {pi_data['extras']}"
+        f"💰 Subtotal: {quote.subtotal:,.2f} Birr\n"
+        f"📊 VAT (15%): {quote.vat:,.2f} Birr\n"
+        f"💵 *Grand Total: {quote.grand_total:,.2f} Birr*\n\n"
+        f"🧰 Extras: {quote.extras}"
     )
 
     keyboard = [
@@ -511,9 +343,58 @@ async def extras(update: Update, context: CallbackContext):
         [InlineKeyboardButton("⬅️ Back", callback_data='confirm_back'), InlineKeyboardButton("❌ Cancel", callback_data='confirm_no')]
     ]
     reply_markup = InlineKeyboardMarkup(keyboard)
-    await update.message.reply_text(draft, reply_markup=reply_markup, parse_mode='Markdown')
+    await message.reply_text(draft, reply_markup=reply_markup, parse_mode='Markdown')
     return CONFIRM
 
+@instrumented
+async def quick_pi(update: Update, context: CallbackContext):
+    """/quickpi customer; location; GRADE PRICExQTY, ...; extras - the whole quote in one message"""
+    context.user_data.clear()
+    context.user_data['pi_data'] = {
+        'user_id': update.effective_user.id,
+        'username': update.effective_user.username or update.effective_user.first_name,
+        'created_at': datetime.now().isoformat()
+    }
+    # Whatever follows the command, which may be separated from it by a newline rather than a space
+    text = ''.join(update.message.text.split(maxsplit=1)[1:]).strip()
+    if not text:
+        keyboard = [['❌ Cancel']]
+        reply_markup = ReplyKeyboardMarkup(keyboard, one_time_keyboard=True, resize_keyboard=True)
+        await update.message.reply_text(
+            "⚡ Send the whole quote in one message:\n"
+            "customer; location; GRADE PRICExQTY, ...; extras\n\n"
+            f"Example: {QUICKPI_EXAMPLE}",
+            reply_markup=reply_markup
+        )
+        return QUICK
+    return await read_quick_quote(update, context, text)
+
+@instrumented
+async def quick_input(update: Update, context: CallbackContext):
+    if update.message.text == '❌ Cancel':
+        return await cancel(update, context)
+    return await read_quick_quote(update, context, update.message.text)
+
+async def read_quick_quote(update: Update, context: CallbackContext, text: str):
+    try:
+        fields = parse_quick_quote(text, GRADES_LIST, EXTRAS_LIST)
+    except QuickQuoteError as e:
+        keyboard = [['❌ Cancel']]
+        reply_markup = ReplyKeyboardMarkup(keyboard, one_time_keyboard=True, resize_keyboard=True)
+        await update.message.reply_text(
+            "❌ " + "\n❌ ".join(e.errors) + "\n\n"
+            f"Available grades: {', '.join(GRADES_LIST)}\n"
+            f"Extras: {', '.join(EXTRAS_LIST)}\n"
+            f"Send it again, e.g. {QUICKPI_EXAMPLE}",
+            reply_markup=reply_markup
+        )
+        return QUICK
+    context.user_data['pi_data'].update(fields)
+    # Back from the draft goes to extras, then the last grade's quantity, as in /createpi
+    context.user_data['current_grade_index'] = len(fields['grades']) - 1
+    return await show_draft(update.message, context)
+
+@instrumented
 async def confirm(update: Update, context: CallbackContext):
     query = update.callback_query
     await query.answer()
@@ -527,56 +408,73 @@ async def confirm(update: Update, context: CallbackContext):
         return EXTRAS
 
     if query.data == 'confirm_yes':
-        global bot_data
-        bot_data['quote_counter'] += 1
-        quote_number = f"RMX-{bot_data['quote_counter']:04d}"
-        pi_data = context.user_data['pi_data']
-        pi_data['quote_number'] = quote_number
-        pi_data['status'] = 'pending'
-        bot_data['quotes'][quote_number] = pi_data
-        save_data(bot_data)
-        
-        subtotal = sum(pi_data['unit_price'][g]*pi_data['quantity'][g] for g in pi_data['grades'])
-        vat = subtotal * 0.15
-        grand_total = subtotal + vat
-        
+        try:
+            quote = Quote.from_dict(context.user_data['pi_data'])
+        except InvalidOperation:
+            await query.edit_message_text("❌ The totals are too large to quote. Use /createpi to start again.")
+            return ConversationHandler.END
+        store.create_quote(quote)
+        # On disk before the user is told it was submitted
+        await store.flush()
+        expiry_scheduler.add(quote)
+
         await query.edit_message_text(
             f"✅ Quote submitted\n"
-            f"Quote No: {quote_number}\n"
-            f"Customer: {pi_data['customer']}\n"
-            f"Subtotal: {subtotal:,.2f} Birr\n"
-            f"VAT (15%): {vat:,.2f} Birr\n"
-            f"Grand Total: {grand_total:,.2f} Birr"
+            f"Quote No: {quote.quote_number}\n"
+            f"Customer: {quote.customer}\n"
+            f"Subtotal: {quote.subtotal:,.2f} Birr\n"
+            f"VAT (15%): {quote.vat:,.2f} Birr\n"
+            f"Grand Total: {quote.grand_total:,.2f} Birr"
         )
-        await notify_admins(context, quote_number, pi_data)
+        await notify_admins(context, quote)
         return ConversationHandler.END
     else:
         await query.edit_message_text("❌ PI creation cancelled. Use /createpi to start again.")
         return ConversationHandler.END
 
-async def notify_admins(context: CallbackContext, quote_number: str, pi_data: dict):
-    subtotal = sum(pi_data['unit_price'][g] * pi_data['quantity'][g] for g in pi_data['grades'])
-    vat = subtotal * 0.15
-    grand_total = subtotal + vat
-    grades_summary = "\n".join([f"• {g}: {pi_data['unit_price'][g]:,.2f} × {pi_data['quantity'][g]:,.2f}m³" for g in pi_data['grades']])
+async def notify_admins(context: CallbackContext, quote: Quote):
+    quote_number = quote.quote_number
+    grades_summary = "\n".join([f"• {item.grade}: {item.unit_price:,.2f} × {item.quantity:,.2f}m³" for item in quote.items])
     admin_message = (
         f"🔔 NEW QUOTE\n"
         f"Quote: {quote_number}\n"
-        f"Customer: {pi_data['customer']}\n"
+        f"Customer: {quote.customer}\n"
         f"Grades:\n{grades_summary}\n"
-        f"Subtotal: {subtotal:,.2f} Birr\n"
-        f"VAT (15%): {vat:,.2f} Birr\n"
-        f"Grand Total: {grand_total:,.2f} Birr\n"
-        f"Extras: {pi_data['extras']}"
+        f"Subtotal: {quote.subtotal:,.2f} Birr\n"
+        f"VAT (15%): {quote.vat:,.2f} Birr\n"
+        f"Grand Total: {quote.grand_total:,.2f} Birr\n"
+        f"Extras: {quote.extras}"
     )
     keyboard = [[InlineKeyboardButton("✅ Approve", callback_data=f'approve_{quote_number}'), InlineKeyboardButton("❌ Reject", callback_data=f'reject_{quote_number}')]]
     reply_markup = InlineKeyboardMarkup(keyboard)
-    for admin_id in ADMIN_IDS:
-        try:
-            await context.bot.send_message(chat_id=admin_id, text=admin_message, reply_markup=reply_markup)
-        except Exception as e:
-            print(f"Failed to notify admin {admin_id}: {e}")
+    sent, failures = await fan_out(
+        send_limiter,
+        ADMIN_IDS,
+        lambda admin_id: context.bot.send_message(chat_id=admin_id, text=admin_message, reply_markup=reply_markup)
+    )
+    for admin_id, e in failures.items():
+        print(f"Failed to notify admin {admin_id}: {e}")
+    # Remember every admin's copy so a decision can be shown on all of them
+    store.update_quote(quote_number, admin_messages={str(admin_id): message.message_id for admin_id, message in sent.items()})
+
+async def mirror_decision(context: CallbackContext, quote: Quote, text: str, decided_message: tuple, messages=None):
+    """Show an approve/reject decision on the other admins' copies of the quote notification"""
+    # decided_message is the (chat id, message id) already showing it; message ids are only unique per chat
+    if messages is None:
+        messages = quote.admin_messages
+    copies = {
+        int(admin_id): message_id for admin_id, message_id in (messages or {}).items()
+        if (int(admin_id), message_id) != decided_message
+    }
+    _, failures = await fan_out(
+        send_limiter,
+        copies,
+        lambda admin_id: context.bot.edit_message_text(chat_id=admin_id, message_id=copies[admin_id], text=text)
+    )
+    for admin_id, e in failures.items():
+        print(f"Failed to update admin {admin_id}'s copy of {quote.quote_number}: {e}")
 
+@instrumented
 async def handle_approval(update: Update, context: CallbackContext):
     query = update.callback_query
     await query.answer()
@@ -584,48 +482,229 @@ async def handle_approval(update: Update, context: CallbackContext):
         await query.answer("⛔ Not authorized.", show_alert=True)
         return
     action, quote_number = query.data.split('_', 1)
-    if quote_number not in bot_data['quotes']:
+    quote = store.get_quote(quote_number)
+    if quote is None:
         await query.edit_message_text("❌ Quote not found.")
         return
-    pi_data = bot_data['quotes'][quote_number]
     if action == 'approve':
-        pi_data['status'] = 'approved'
-        pi_data['approved_by'] = update.effective_user.username or update.effective_user.first_name
-        pi_data['approved_at'] = datetime.now().isoformat()
-        save_data(bot_data)
-        await query.edit_message_text(f"{query.message.text}\n✅ APPROVED by @{pi_data['approved_by']}")
-        pdf_buffer = generate_pdf(pi_data)
+        # Only a pending quote can be decided, so two admins can't approve and reject it at once
+        quote = store.update_quote(
+            quote_number,
+            expected_status='pending',
+            status='approved',
+            approved_by=update.effective_user.username or update.effective_user.first_name,
+            approved_at=datetime.now().isoformat(),
+            # A reminder to the admins while pending doesn't count as the customer's
+            reminded_at=None
+        )
+        if quote is None:
+            await query.edit_message_text(f"{query.message.text}\nℹ️ Already decided.")
+            return
+        # On disk before anyone is told about the decision
+        await store.flush()
+        # Valid from approval now rather than from creation
+        expiry_scheduler.add(quote)
+        decision_text = f"{query.message.text}\n✅ APPROVED by @{quote.approved_by}"
+        await query.edit_message_text(decision_text)
+        await mirror_decision(context, quote, decision_text, (query.message.chat_id, query.message.message_id))
         try:
             # Add "Start Over" button after PDF is sent
             keyboard = [[InlineKeyboardButton("🔄 Create New Quote", callback_data='start_over')]]
             reply_markup = InlineKeyboardMarkup(keyboard)
-            await context.bot.send_document(
-                chat_id=pi_data['user_id'], 
-                document=pdf_buffer, 
-                filename=f"Quote_{quote_number}.pdf", 
+            # The decision is already made, so wait for room rather than turning it away
+            job = await job_queue.submit(lambda: send_quote_pdf(
+                context.bot,
+                quote.user_id,
+                quote,
                 caption=f"✅ Quote Approved\nQuote No: {quote_number}\n\nClick below to create a new quote:",
                 reply_markup=reply_markup
-            )
+            ), owner=quote.user_id, wait=True)
+            if job.position:
+                await query.edit_message_text(f"{decision_text}\n⏳ Busy, PDF queued at position {job.position}")
+            await job
+            if job.position:
+                await query.edit_message_text(decision_text)
         except Exception as e:
             print(f"Failed to send PDF to user: {e}")
     elif action == 'reject':
-        pi_data['status'] = 'rejected'
-        pi_data['rejected_by'] = update.effective_user.username or update.effective_user.first_name
-        pi_data['rejected_at'] = datetime.now().isoformat()
-        save_data(bot_data)
-        await query.edit_message_text(f"{query.message.text}\n❌ REJECTED by @{pi_data['rejected_by']}")
+        quote = store.update_quote(
+            quote_number,
+            expected_status='pending',
+            status='rejected',
+            rejected_by=update.effective_user.username or update.effective_user.first_name,
+            rejected_at=datetime.now().isoformat()
+        )
+        if quote is None:
+            await query.edit_message_text(f"{query.message.text}\nℹ️ Already decided.")
+            return
+        # On disk before anyone is told about the decision
+        await store.flush()
+        decision_text = f"{query.message.text}\n❌ REJECTED by @{quote.rejected_by}"
+        await query.edit_message_text(decision_text)
+        await mirror_decision(context, quote, decision_text, (query.message.chat_id, query.message.message_id))
         try:
             # Add "Start Over" button after rejection
             keyboard = [[InlineKeyboardButton("🔄 Create New Quote", callback_data='start_over')]]
             reply_markup = InlineKeyboardMarkup(keyboard)
             await context.bot.send_message(
-                chat_id=pi_data['user_id'], 
+                chat_id=quote.user_id, 
                 text=f"❌ Your quote {quote_number} was rejected.\n\nClick below to create a new quote:",
                 reply_markup=reply_markup
             )
         except Exception as e:
             print(f"Failed to notify user: {e}")
 
+@instrumented
+async def bulk_upload(update: Update, context: CallbackContext):
+    """Create one pending quote per row of an uploaded CSV/XLSX file and send them for approval together"""
+    document = update.message.document
+    if document.file_size and document.file_size > MAX_BULK_FILE_BYTES:
+        await update.message.reply_text(f"❌ File too large; the limit is {MAX_BULK_FILE_BYTES // (1024 * 1024)} MB.")
+        return
+    data = bytes(await (await document.get_file()).download_as_bytearray())
+    user = update.effective_user
+    try:
+        quotes = parse_bulk_quotes(
+            read_rows(document.file_name or '', data),
+            user.id, user.username or user.first_name, GRADES_LIST, EXTRAS_LIST
+        )
+    except BulkUploadError as e:
+        shown = e.errors[:20]
+        if len(e.errors) > len(shown):
+            shown.append(f"… and {len(e.errors) - len(shown)} more")
+        await update.message.reply_text("❌ No quotes were created. Fix the file and send it again:\n" + "\n".join(shown))
+        return
+
+    store.create_quotes(quotes)
+    await store.flush()
+    for quote in quotes:
+        expiry_scheduler.add(quote)
+    first, last = quotes[0].quote_number, quotes[-1].quote_number
+    await update.message.reply_text(
+        f"✅ {len(quotes)} quotes submitted\n"
+        f"Quote No: {first} – {last}\n"
+        f"Grand Total: {sum(q.grand_total for q in quotes):,.2f} Birr\n\n"
+        f"You will get all PDFs in one zip once they are approved."
+    )
+    await notify_admins_batch(context, quotes)
+
+async def notify_admins_batch(context: CallbackContext, quotes: list):
+    first, last = quotes[0].quote_number, quotes[-1].quote_number
+    summary = "\n".join(
+        f"• {q.quote_number} {q.customer}: {q.items[0].grade} {q.items[0].quantity:,.2f}m³ = {q.grand_total:,.2f}"
+        for q in quotes[:15]
+    )
+    if len(quotes) > 15:
+        summary += f"\n… and {len(quotes) - 15} more"
+    admin_message = (
+        f"🔔 NEW BULK QUOTES\n"
+        f"Quotes: {first} – {last} ({len(quotes)})\n"
+        f"From: @{quotes[0].username}\n"
+        f"{summary}\n"
+        f"Grand Total: {sum(q.grand_total for q in quotes):,.2f} Birr"
+    )
+    keyboard = [[InlineKeyboardButton("✅ Approve all", callback_data=f'bapprove_{first}_{last}'), InlineKeyboardButton("❌ Reject all", callback_data=f'breject_{first}_{last}')]]
+    reply_markup = InlineKeyboardMarkup(keyboard)
+    sent, failures = await fan_out(
+        send_limiter,
+        ADMIN_IDS,
+        lambda admin_id: context.bot.send_message(chat_id=admin_id, text=admin_message, reply_markup=reply_markup)
+    )
+    for admin_id, e in failures.items():
+        print(f"Failed to notify admin {admin_id}: {e}")
+    # Kept apart from the first quote's admin_messages, so deciding or expiring that quote alone
+    # leaves the batch's buttons alone
+    store.update_quote(first, batch_messages={str(admin_id): message.message_id for admin_id, message in sent.items()})
+
+def decide_quotes(quote_numbers, approve: bool, decided_by: str):
+    """Approve or reject those of the quotes that are still pending, in one store write; returns them"""
+    now = datetime.now().isoformat()
+    if approve:
+        fields = {'status': 'approved', 'approved_by': decided_by, 'approved_at': now, 'reminded_at': None}
+    else:
+        fields = {'status': 'rejected', 'rejected_by': decided_by, 'rejected_at': now}
+    quotes = store.update_quotes({qn: fields for qn in quote_numbers}, expected_status='pending')
+    if approve:
+        for quote in quotes:
+            expiry_scheduler.add(quote)
+    return quotes
+
+@instrumented
+async def handle_batch_approval(update: Update, context: CallbackContext):
+    """Approve or reject a bulk upload; approved quotes go back to the customer as one zip of PDFs"""
+    query = update.callback_query
+    if update.effective_user.id not in ADMIN_IDS:
+        await query.answer("⛔ Not authorized.", show_alert=True)
+        return
+    await query.answer()
+    action, first, last = query.data.split('_')
+    decided_by = update.effective_user.username or update.effective_user.first_name
+    # Quotes decided one by one in the meantime keep that decision
+    quotes = decide_quotes(quote_numbers_between(first, last), action == 'bapprove', decided_by)
+    if not quotes:
+        await query.edit_message_text(f"{query.message.text}\nℹ️ Already decided.")
+        return
+    await store.flush()
+    if action == 'bapprove':
+        decision_text = f"{query.message.text}\n✅ APPROVED {len(quotes)} quotes by @{decided_by}"
+    else:
+        decision_text = f"{query.message.text}\n❌ REJECTED {len(quotes)} quotes by @{decided_by}"
+    await query.edit_message_text(decision_text)
+    batch = store.get_quote(first)
+    await mirror_decision(context, batch, decision_text, (query.message.chat_id, query.message.message_id), batch.batch_messages)
+
+    keyboard = [[InlineKeyboardButton("🔄 Create New Quote", callback_data='start_over')]]
+    reply_markup = InlineKeyboardMarkup(keyboard)
+    try:
+        if action == 'bapprove':
+            async def send_archive():
+                # Renders run in parallel, bounded by the PDF worker pool
+                pdfs = await asyncio.gather(*(quote_pdf_bytes(quote) for quote in quotes))
+                archive = await asyncio.to_thread(zip_pdfs, {quote.quote_number: pdf for quote, pdf in zip(quotes, pdfs)})
+                await context.bot.send_document(
+                    chat_id=quotes[0].user_id,
+                    document=archive,
+                    filename=f"Quotes_{first}_{last}.zip",
+                    caption=f"✅ {len(quotes)} quotes approved ({first} – {last})",
+                    reply_markup=reply_markup
+                )
+
+            job = await job_queue.submit(send_archive, owner=update.effective_user.id, priority=BULK, wait=True)
+            if job.position:
+                await query.edit_message_text(f"{decision_text}\n⏳ Busy, PDFs queued at position {job.position}")
+            await job
+            if job.position:
+                await query.edit_message_text(decision_text)
+        else:
+            await context.bot.send_message(
+                chat_id=quotes[0].user_id,
+                text=f"❌ Your quotes {first} – {last} were rejected.",
+                reply_markup=reply_markup
+            )
+    except Exception as e:
+        print(f"Failed to send batch {first} – {last} to user: {e}")
+
+async def send_quote_pdf(bot, chat_id, quote, caption, reply_markup=None):
+    """Send a quote's PDF, referencing the file Telegram already has when it was uploaded before."""
+    quote_number = quote.quote_number
+    key = pdf_key(quote)
+    if quote.pdf_file_id and quote.pdf_key == key:
+        try:
+            return await bot.send_document(chat_id=chat_id, document=quote.pdf_file_id, caption=caption, reply_markup=reply_markup)
+        except BadRequest as e:
+            print(f"Stored file_id for {quote_number} was rejected, uploading again: {e}")
+    pdf_bytes = await quote_pdf_bytes(quote)
+    message = await bot.send_document(
+        chat_id=chat_id,
+        document=pdf_bytes,
+        filename=f"Quote_{quote_number}.pdf",
+        caption=caption,
+        reply_markup=reply_markup
+    )
+    store.update_quote(quote_number, pdf_file_id=message.document.file_id, pdf_key=key)
+    return message
+
+@instrumented
 async def handle_start_over(update: Update, context: CallbackContext):
     """Handle the start over button click"""
     query = update.callback_query
@@ -642,61 +721,531 @@ async def handle_start_over(update: Update, context: CallbackContext):
     await query.message.reply_text("👤 Enter customer/company name:", reply_markup=reply_markup)
     return CUSTOMER
 
+def quotes_page(user_id: int, status_filter: str, page: int):
+    """Text and inline keyboard for one page of a user's quotes"""
+    status = None if status_filter == 'all' else status_filter
+    total = store.count_by_user(user_id, status)
+    pages = max(1, -(-total // MYQUOTES_PAGE_SIZE))
+    page = min(max(page, 0), pages - 1)
+    page_quotes = store.list_by_user(user_id, status, offset=page * MYQUOTES_PAGE_SIZE, limit=MYQUOTES_PAGE_SIZE)
+
+    entries = []
+    for quote in page_quotes:
+        entries.append(f"{quote.quote_number} · {quote.customer}\nGrand Total: {quote.grand_total:,.2f} Birr · {quote.status}")
+    text = (
+        f"📋 Your quotes: {status_filter.capitalize()} (page {page + 1}/{pages})\n\n"
+        + ("\n\n".join(entries) or "No quotes here.")
+    )
+
+    keyboard = [[
+        InlineKeyboardButton(f"• {f.capitalize()}" if f == status_filter else f.capitalize(), callback_data=f"mq_{f}_0")
+        for f in MYQUOTES_FILTERS
+    ]]
+    downloads = [
+        InlineKeyboardButton(f"📄 {quote.quote_number}", callback_data=f"pdf_{quote.quote_number}")
+        for quote in page_quotes if quote.status == 'approved'
+    ]
+    if downloads:
+        keyboard.append(downloads)
+    nav = []
+    if page > 0:
+        nav.append(InlineKeyboardButton("⬅️ Prev", callback_data=f"mq_{status_filter}_{page - 1}"))
+    if page < pages - 1:
+        nav.append(InlineKeyboardButton("Next ➡️", callback_data=f"mq_{status_filter}_{page + 1}"))
+    if nav:
+        keyboard.append(nav)
+    return text, InlineKeyboardMarkup(keyboard)
+
+@instrumented
 async def myquotes(update: Update, context: CallbackContext):
     user_id = update.effective_user.id
-    user_quotes = [q for q in bot_data['quotes'].values() if q['user_id'] == user_id]
-    if not user_quotes:
+    if store.count_by_user(user_id) == 0:
         await update.message.reply_text("You have no quotes yet.")
         return
-    for pi in user_quotes:
-        subtotal = sum(pi['unit_price'][g] * pi['quantity'][g] for g in pi['grades'])
-        vat = subtotal * 0.15
-        grand_total = subtotal + vat
+    text, reply_markup = quotes_page(user_id, 'all', 0)
+    await update.message.reply_text(text, reply_markup=reply_markup)
+
+@instrumented
+async def myquotes_page(update: Update, context: CallbackContext):
+    """Page through /myquotes or change its status filter, editing the message in place"""
+    query = update.callback_query
+    await query.answer()
+    _, status_filter, page = query.data.split('_')
+    if status_filter not in MYQUOTES_FILTERS:
+        return
+    text, reply_markup = quotes_page(update.effective_user.id, status_filter, int(page))
+    try:
+        await query.edit_message_text(text, reply_markup=reply_markup)
+    except BadRequest as e:
+        # Clicking the filter that is already shown leaves the message unchanged
+        if 'not modified' not in str(e):
+            raise
+
+@instrumented
+async def download_pdf(update: Update, context: CallbackContext):
+    """Send an approved quote's PDF again, from the PDF cache when possible"""
+    query = update.callback_query
+    quote_number = query.data.split('_', 1)[1]
+    quote = store.get_quote(quote_number)
+    if quote is None or (quote.user_id != update.effective_user.id and update.effective_user.id not in ADMIN_IDS):
+        await query.answer("❌ Quote not found.", show_alert=True)
+        return
+    if quote.status != 'approved':
+        await query.answer(
+            "⌛ This quote has expired." if quote.status == 'expired' else "⏳ This quote is not approved yet.",
+            show_alert=True
+        )
+        return
+    try:
+        job = await job_queue.submit(
+            lambda: send_quote_pdf(context.bot, query.message.chat_id, quote, caption=f"📄 Quote No: {quote_number}"),
+            owner=update.effective_user.id
+        )
+    except JobQueueFull:
+        await query.answer("⏳ The bot is busy right now. Please try again in a minute.", show_alert=True)
+        return
+    await query.answer(f"⏳ Busy, queued at position {job.position}" if job.position else None)
+    try:
+        await job
+    except Exception as e:
+        print(f"Failed to send PDF for {quote_number}: {e}")
+
+def pending_page(selected: list, page: int):
+    """Text and inline keyboard for one page of the admin /pending list, with selected quotes ticked"""
+    pending = store.list_by_status('pending')
+    pages = max(1, -(-len(pending) // PENDING_PAGE_SIZE))
+    page = min(max(page, 0), pages - 1)
+    page_quotes = pending[page * PENDING_PAGE_SIZE:(page + 1) * PENDING_PAGE_SIZE]
+    text = (
+        f"⏳ Pending quotes: {len(pending)} (page {page + 1}/{pages})\n"
+        f"Selected: {len(selected)}\n\n"
+        + ("Tap quotes to select them, then approve or reject the selection." if pending else "Nothing is waiting for approval.")
+    )
+    keyboard = [
+        [InlineKeyboardButton(
+            f"{'☑️' if quote.quote_number in selected else '⬜'} {quote.quote_number} · {quote.customer} · {quote.grand_total:,.2f}",
+            callback_data=f"pq_t_{page}_{quote.quote_number}"
+        )]
+        for quote in page_quotes
+    ]
+    nav = []
+    if page > 0:
+        nav.append(InlineKeyboardButton("⬅️ Prev", callback_data=f"pq_p_{page - 1}"))
+    if pending:
+        nav.append(InlineKeyboardButton("Select page", callback_data=f"pq_a_{page}"))
+    if selected:
+        nav.append(InlineKeyboardButton("Clear", callback_data=f"pq_c_{page}"))
+    if page < pages - 1:
+        nav.append(InlineKeyboardButton("Next ➡️", callback_data=f"pq_p_{page + 1}"))
+    if nav:
+        keyboard.append(nav)
+    if selected:
+        keyboard.append([
+            InlineKeyboardButton(f"✅ Approve {len(selected)}", callback_data=f"pq_ok_{page}"),
+            InlineKeyboardButton(f"❌ Reject {len(selected)}", callback_data=f"pq_no_{page}")
+        ])
+    return text, InlineKeyboardMarkup(keyboard)
+
+@instrumented
+async def pending_quotes(update: Update, context: CallbackContext):
+    if update.effective_user.id not in ADMIN_IDS:
+        await update.message.reply_text("⛔ Not authorized.")
+        return
+    context.user_data['pending_selection'] = []
+    text, reply_markup = pending_page([], 0)
+    await update.message.reply_text(text, reply_markup=reply_markup)
+
+@instrumented
+async def pending_action(update: Update, context: CallbackContext):
+    """Selection, paging and the approve/reject buttons of the /pending list"""
+    query = update.callback_query
+    if update.effective_user.id not in ADMIN_IDS:
+        await query.answer("⛔ Not authorized.", show_alert=True)
+        return
+    _, action, page, *rest = query.data.split('_', 3)
+    page = int(page)
+    # A list rather than a set so user_data stays JSON-serializable for persistence
+    selected = context.user_data.setdefault('pending_selection', [])
+    if action == 't':
+        quote_number = rest[0]
+        if quote_number in selected:
+            selected.remove(quote_number)
+        else:
+            selected.append(quote_number)
+    elif action == 'a':
+        page_quotes = store.list_by_status('pending')[page * PENDING_PAGE_SIZE:(page + 1) * PENDING_PAGE_SIZE]
+        selected.extend(q.quote_number for q in page_quotes if q.quote_number not in selected)
+    elif action == 'c':
+        selected.clear()
+    elif action in ('ok', 'no'):
+        position = job_queue.position(update.effective_user.id, BULK)
+        await query.answer(f"⏳ Busy, queued at position {position}" if position else "⏳ Working on it...")
+        decided_by = update.effective_user.username or update.effective_user.first_name
+        quotes = decide_quotes(list(selected), action == 'ok', decided_by)
+        selected.clear()
+        await store.flush()
+        sent, failed = await notify_decisions(context, quotes, action == 'ok', update.effective_user.id)
+        verb = "Approved" if action == 'ok' else "Rejected"
+        summary = f"{'✅' if action == 'ok' else '❌'} {verb} {len(quotes)} quotes; {sent} customers notified"
+        if failed:
+            summary += f", {failed} failed"
+        await query.message.reply_text(summary)
+        # Clear the buttons on the admins' individual notifications in the background
+        emoji = '✅ APPROVED' if action == 'ok' else '❌ REJECTED'
+        for quote in quotes:
+            context.application.create_task(
+                mirror_decision(context, quote, f"🔔 {quote.quote_number} · {quote.customer}\n{emoji} by @{decided_by}", None)
+            )
+    if action not in ('ok', 'no'):
+        await query.answer()
+    # Quotes decided elsewhere in the meantime drop out of the selection
+    pending_numbers = {q.quote_number for q in store.list_by_status('pending')}
+    selected[:] = [qn for qn in selected if qn in pending_numbers]
+    text, reply_markup = pending_page(selected, page)
+    try:
+        await query.edit_message_text(text, reply_markup=reply_markup)
+    except BadRequest as e:
+        if 'not modified' not in str(e):
+            raise
+
+async def notify_decisions(context: CallbackContext, quotes: list, approved: bool, owner: int):
+    """Tell each quote's customer about a decision, one bulk job per quote on behalf of owner (the admin).
+
+    Each job renders its PDF just before sending it, so memory stays bounded by the job workers
+    however many quotes were decided. Returns (sent, failed) counts.
+    """
+    keyboard = [[InlineKeyboardButton("🔄 Create New Quote", callback_data='start_over')]]
+    reply_markup = InlineKeyboardMarkup(keyboard)
+    if approved:
+        def notice(quote):
+            return send_with_retry(send_limiter, quote.user_id, lambda: send_quote_pdf(
+                context.bot, quote.user_id, quote,
+                caption=f"✅ Quote Approved\nQuote No: {quote.quote_number}\n\nClick below to create a new quote:",
+                reply_markup=reply_markup
+            ))
+    else:
+        def notice(quote):
+            return send_with_retry(send_limiter, quote.user_id, lambda: context.bot.send_message(
+                chat_id=quote.user_id,
+                text=f"❌ Your quote {quote.quote_number} was rejected.\n\nClick below to create a new quote:",
+                reply_markup=reply_markup
+            ))
+    # A full queue makes us wait for room, which paces a large decision to the workers
+    jobs = [
+        await job_queue.submit(lambda quote=quote: notice(quote), owner=owner, priority=BULK, wait=True)
+        for quote in quotes
+    ]
+    outcomes = await asyncio.gather(*jobs, return_exceptions=True)
+    for quote, outcome in zip(quotes, outcomes):
+        if isinstance(outcome, Exception):
+            print(f"Failed to notify customer of {quote.quote_number}: {outcome}")
+    failed = sum(isinstance(outcome, Exception) for outcome in outcomes)
+    return len(quotes) - failed, failed
+
+@instrumented
+async def export_quotes(update: Update, context: CallbackContext):
+    """Admin-only: /export [csv|xlsx] [status] [from YYYY-MM-DD] [to YYYY-MM-DD]"""
+    if update.effective_user.id not in ADMIN_IDS:
+        await update.message.reply_text("⛔ Not authorized.")
+        return
+    export_format, status, dates = 'csv', None, []
+    try:
+        for arg in context.args:
+            if arg.lower() in EXPORT_WRITERS:
+                export_format = arg.lower()
+            elif arg.lower() in MYQUOTES_FILTERS:
+                status = None if arg.lower() == 'all' else arg.lower()
+            else:
+                dates.append(datetime.strptime(arg, '%Y-%m-%d').date())
+        if len(dates) > 2:
+            raise ValueError("too many dates")
+    except ValueError:
+        await update.message.reply_text(
+            "Usage: /export [csv|xlsx] [all|pending|approved|rejected|expired] [from YYYY-MM-DD] [to YYYY-MM-DD]\n"
+            "Example: /export xlsx approved 2025-01-01 2025-03-31"
+        )
+        return
+    since = dates[0].isoformat() if dates else None
+    before = (dates[1] + timedelta(days=1)).isoformat() if len(dates) == 2 else None
+
+    filename = '_'.join(['quotes', status or 'all'] + [d.isoformat() for d in dates]) + f'.{export_format}'
+
+    async def send_export():
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            path = os.path.join(tmp_dir, filename)
+            try:
+                # Rows go from the store straight to the file in a worker thread; nothing is collected in memory
+                count = await asyncio.to_thread(EXPORT_WRITERS[export_format], store.iter_quotes(status, since, before), path)
+            except RuntimeError as e:
+                await update.message.reply_text(f"❌ {e}")
+                return
+            if count == 0:
+                await update.message.reply_text("No quotes match these filters.")
+                return
+            with open(path, 'rb') as f:
+                await context.bot.send_document(
+                    chat_id=update.effective_chat.id,
+                    document=f,
+                    filename=filename,
+                    caption=f"📊 {count} quotes"
+                )
+
+    try:
+        job = await job_queue.submit(send_export, owner=update.effective_user.id, priority=BULK)
+    except JobQueueFull:
+        await update.message.reply_text("⏳ The bot is busy right now. Please try /export again in a few minutes.")
+        return
+    if job.position:
+        await update.message.reply_text(f"⏳ Busy, export queued at position {job.position}")
+    else:
+        await update.message.reply_text("⏳ Preparing export...")
+    await job
+
+def stats_text(stats):
+    """The /stats report, read from the running totals only"""
+    def total(cells, field, statuses=None):
+        return sum(sums[field] for status, sums in cells.items() if statuses is None or status in statuses)
+
+    overall = stats.get('all')
+    approved, rejected = total(overall, 'count', ['approved']), total(overall, 'count', ['rejected'])
+    lines = [
+        "📊 Quote statistics\n",
+        f"📋 Quotes: {total(overall, 'count')} (⏳ {total(overall, 'count', ['pending'])} pending, "
+        f"✅ {approved} approved, ❌ {rejected} rejected, ⌛ {total(overall, 'count', ['expired'])} expired)",
+    ]
+    if approved + rejected:
+        lines.append(f"👍 Approval rate: {approved / (approved + rejected):.0%}")
+    if approved:
+        hours = total(overall, 'approval_seconds', ['approved']) / approved / 3600
+        lines.append(f"⏱ Average time to approval: {hours:,.1f} h")
+    lines += [
+        f"💰 Approved: {cents_to_birr(total(overall, 'subtotal_cents', ['approved'])):,.2f} Birr before VAT, "
+        f"{cents_to_birr(total(overall, 'total_cents', ['approved'])):,.2f} Birr with VAT",
+        f"📏 Approved volume: {litres_to_m3(total(overall, 'litres', ['approved'])):,.2f} m³",
+        f"⏳ Pending: {cents_to_birr(total(overall, 'total_cents', ['pending'])):,.2f} Birr with VAT, "
+        f"{litres_to_m3(total(overall, 'litres', ['pending'])):,.2f} m³",
+    ]
+    grades = stats.keys('grade')
+    if grades:
+        lines.append("\n🧱 By grade (quoted / approved):")
+        for grade in grades:
+            cells = stats.get('grade', grade)
+            lines.append(
+                f"• {grade}: {litres_to_m3(total(cells, 'litres')):,.2f} / "
+                f"{litres_to_m3(total(cells, 'litres', ['approved'])):,.2f} m³ · "
+                f"{cents_to_birr(total(cells, 'subtotal_cents', ['approved'])):,.2f} Birr approved before VAT"
+            )
+    days = stats.keys('day')[-STATS_DAYS:]
+    if days:
+        lines.append(f"\n📅 Last {len(days)} days with quotes:")
+        for day in days:
+            cells = stats.get('day', day)
+            lines.append(
+                f"• {day or 'unknown'}: {total(cells, 'count')} quotes, {total(cells, 'count', ['approved'])} approved · "
+                f"{litres_to_m3(total(cells, 'litres')):,.2f} m³ · {cents_to_birr(total(cells, 'total_cents')):,.2f} Birr"
+            )
+    return "\n".join(lines)
+
+@instrumented
+async def stats_command(update: Update, context: CallbackContext):
+    """Admin-only: /stats, or /stats rebuild to recompute the totals from every quote"""
+    if update.effective_user.id not in ADMIN_IDS:
+        await update.message.reply_text("⛔ Not authorized.")
+        return
+    if context.args and context.args[0].lower() == 'rebuild':
+        differences = await store.recompute_stats()
         await update.message.reply_text(
-            f"Quote: {pi['quote_number']}\n"
-            f"Customer: {pi['customer']}\n"
-            f"Subtotal: {subtotal:,.2f} Birr\n"
-            f"VAT (15%): {vat:,.2f} Birr\n"
-            f"Grand Total: {grand_total:,.2f} Birr\n"
-            f"Status: {pi['status']}"
+            "✅ Statistics match the quotes." if not differences
+            else f"⚠️ Rebuilt statistics; {differences} totals were out of date."
         )
+    await update.message.reply_text(stats_text(store.get_stats()))
 
+@instrumented
 async def cancel(update: Update, context: CallbackContext):
     await update.message.reply_text("❌ Operation cancelled. Use /createpi to start again.", reply_markup=ReplyKeyboardRemove())
     return ConversationHandler.END
 
+def summary_lines(lines, limit=15):
+    shown = "\n".join(lines[:limit])
+    if len(lines) > limit:
+        shown += f"\n… and {len(lines) - limit} more"
+    return shown
+
+async def notify_expiry(context: CallbackContext, reminded: list, expired: list):
+    """Report one run of the expiry scheduler with one message per customer and one per admin.
+
+    Reminders go to the customer once approved and to the admins while pending; expiries go to
+    the customer, and to the admins if the quote was never decided.
+    """
+    customers, expired_customers, admin_lines = {}, set(), []
+    for quote, status, expires in reminded:
+        until = expires.strftime('%b %d, %Y %H:%M')
+        if status == 'approved':
+            customers.setdefault(quote.user_id, []).append(
+                f"⏰ Your quote {quote.quote_number} · {quote.customer} is valid until {until}. Confirm your order before then."
+            )
+        else:
+            admin_lines.append(f"⏰ Quote {quote.quote_number} · {quote.customer} is still pending and expires on {until}.")
+    for quote, status, expires in expired:
+        customers.setdefault(quote.user_id, []).append(f"⌛ Your quote {quote.quote_number} · {quote.customer} has expired.")
+        expired_customers.add(quote.user_id)
+        if status == 'pending':
+            admin_lines.append(f"⌛ Quote {quote.quote_number} · {quote.customer} expired without a decision.")
+            # Clear the approve/reject buttons of its own notification, if it had one
+            context.application.create_task(
+                mirror_decision(context, quote, f"🔔 {quote.quote_number} · {quote.customer}\n⌛ EXPIRED without a decision", None)
+            )
+
+    keyboard = InlineKeyboardMarkup([[InlineKeyboardButton("🔄 Create New Quote", callback_data='start_over')]])
+    def customer_message(user_id):
+        text = summary_lines(customers[user_id])
+        if user_id not in expired_customers:
+            return context.bot.send_message(chat_id=user_id, text=text)
+        return context.bot.send_message(chat_id=user_id, text=f"{text}\n\nClick below to create a new quote:", reply_markup=keyboard)
+
+    _, failures = await fan_out(send_limiter, customers, customer_message)
+    for user_id, e in failures.items():
+        print(f"Failed to tell customer {user_id} about {len(customers[user_id])} expiring quotes: {e}")
+    if admin_lines:
+        admin_text = summary_lines(admin_lines)
+        _, failures = await fan_out(
+            send_limiter, ADMIN_IDS, lambda admin_id: context.bot.send_message(chat_id=admin_id, text=admin_text)
+        )
+        for admin_id, e in failures.items():
+            print(f"Failed to tell admin {admin_id} about {len(admin_lines)} expiring quotes: {e}")
+
+# Reminds about and expires pending and approved quotes, on the application's job queue
+expiry_scheduler = ExpiryScheduler(store, notify_expiry)
+
+async def start_expiry(application: Application):
+    # Every open quote is needed, so the rest of the store has to be loaded first
+    await store.load_remaining()
+    if application.job_queue is None:
+        print("⚠️ Quotes won't expire: install python-telegram-bot[job-queue]")
+        return
+    quotes = store.list_open()
+    worker = application.bot_data.get('worker')
+    if worker is not None:
+        # Each worker takes the quotes of the users routed to it, so nobody is reminded twice
+        quotes = [quote for quote in quotes if quote.user_id % BOT_WORKERS == worker]
+    expiry_scheduler.start(application.job_queue, quotes)
+    print(f"⏰ Tracking the validity of {len(quotes)} quotes")
+
+async def post_init(application: Application):
+    global metrics_server, store_writer
+    store_writer = asyncio.create_task(store.run_writer())
+    startup_tasks.append(asyncio.create_task(start_expiry(application)))
+    if PDF_WARMUP:
+        startup_tasks.append(asyncio.create_task(warm_renderer()))
+    if METRICS_PORT:
+        # One port per worker process
+        port = METRICS_PORT + application.bot_data.get('worker', 0)
+        metrics_server = await serve_http(metrics_routes(), METRICS_HOST, port)
+        print(f"📈 Metrics on http://{METRICS_HOST}:{port}/metrics")
+    # Process start until the bot can take updates: imports, store load and Bot API login
+    startup_seconds = time.perf_counter() - STARTED
+    metrics.gauge('startup_seconds', lambda: startup_seconds)
+    print(f"🚀 Ready {startup_seconds:.2f}s after start")
+
+async def post_shutdown(application: Application):
+    if store_writer is not None:
+        # Last fsync, or the compaction it was in the middle of
+        store.stop_writer()
+        await store_writer
+    if metrics_server is not None:
+        metrics_server.close()
+        await metrics_server.wait_closed()
+    # Renders and sends already queued finish before the PDF workers go away
+    await job_queue.stop()
+    shutdown_renderer()
+
+def build_application(request=None, worker=None):
+    """Application with every handler registered. request replaces the HTTP transport to the Bot API;
+    worker is the index of this process when running several."""
+    conversations_file = CONVERSATIONS_FILE if worker is None else f'conversations-{worker}.json'
+    persistence = ConversationPersistence(conversations_file, update_interval=PERSIST_INTERVAL)
+    builder = (
+        Application.builder()
+        .token(BOT_TOKEN)
+        .persistence(persistence)
+        .post_init(post_init)
+        .post_shutdown(post_shutdown)
+    )
+    if TELEGRAM_API_URL:
+        builder = builder.base_url(TELEGRAM_API_URL)
+    if request is not None:
+        builder = builder.get_updates_request(request)
+    # Same pool size PTB picks by default; getUpdates long polls stay out of the latency metrics
+    builder = builder.request(InstrumentedRequest(request or HTTPXRequest(connection_pool_size=256)))
+    application = builder.build()
+    if worker is not None:
+        application.bot_data['worker'] = worker
+
+    def conversations_by_state():
+        states = list(persistence.conversations.get('createpi', {}).values())
+        return [({'state': name}, states.count(state)) for state, name in enumerate(STATE_NAMES)]
+    metrics.gauge('conversations', conversations_by_state)
+
+    conv_handler = ConversationHandler(
+        entry_points=[CommandHandler('createpi', create_pi), CommandHandler('quickpi', quick_pi), CallbackQueryHandler(handle_start_over, pattern='^start_over$')],
+        states={
+            CUSTOMER: [MessageHandler(filters.TEXT & ~filters.COMMAND, customer_name)],
+            LOCATION_INPUT: [MessageHandler(filters.TEXT & ~filters.COMMAND, location_input)],
+            GRADES: [MessageHandler(filters.TEXT & ~filters.COMMAND, grades)],
+            PRICE: [MessageHandler(filters.TEXT & ~filters.COMMAND, price)],
+            QUANTITY: [MessageHandler(filters.TEXT & ~filters.COMMAND, quantity)],
+            EXTRAS: [MessageHandler(filters.TEXT & ~filters.COMMAND, extras)],
+            CONFIRM: [CallbackQueryHandler(confirm, pattern='^confirm_')],
+            QUICK: [MessageHandler(filters.TEXT & ~filters.COMMAND, quick_input)]
+        },
+        fallbacks=[CommandHandler('cancel', cancel)],
+        per_message=False,
+        name='createpi',
+        persistent=True
+    )
+
+    application.add_handler(conv_handler)
+    application.add_handler(CommandHandler('start', start))
+    application.add_handler(CommandHandler('help', help_command))
+    application.add_handler(CommandHandler('myquotes', myquotes))
+    # Large exports take a while; block=False keeps the bot answering meanwhile
+    application.add_handler(CommandHandler('export', export_quotes, block=False))
+    application.add_handler(CommandHandler('pending', pending_quotes))
+    application.add_handler(CommandHandler('stats', stats_command))
+    # block=False: approving a large selection renders and sends for a while
+    application.add_handler(CallbackQueryHandler(pending_action, pattern='^pq_', block=False))
+    application.add_handler(CallbackQueryHandler(myquotes_page, pattern='^mq_'))
+    application.add_handler(CallbackQueryHandler(download_pdf, pattern='^pdf_', block=False))
+    # Approvals render PDFs; block=False keeps other updates flowing while they do
+    application.add_handler(CallbackQueryHandler(handle_approval, pattern='^(approve|reject)_', block=False))
+    application.add_handler(CallbackQueryHandler(handle_batch_approval, pattern='^(bapprove|breject)_', block=False))
+    application.add_handler(MessageHandler(filters.Document.FileExtension('csv') | filters.Document.FileExtension('xlsx'), bulk_upload))
+    return application
+
 def main():
     print("Starting bot initialization...")
+    if BOT_MODE == 'webhook' and WEBHOOK_URL and not WEBHOOK_SECRET:
+        print("❌ WEBHOOK_URL needs WEBHOOK_SECRET, so only Telegram can post updates")
+        return
+    if BOT_WORKERS > 1:
+        if BOT_MODE != 'webhook' or QUOTE_STORE != 'sqlite':
+            print("❌ BOT_WORKERS > 1 needs BOT_MODE=webhook and QUOTE_STORE=sqlite")
+            return
+        print(f"🤖 Bot is serving webhooks with {BOT_WORKERS} workers... Press Ctrl+C to stop.")
+        bot = Bot(BOT_TOKEN, base_url=TELEGRAM_API_URL) if TELEGRAM_API_URL else Bot(BOT_TOKEN)
+        asyncio.run(run_workers(build_application, BOT_WORKERS, bot, WEBHOOK_HOST, WEBHOOK_PORT, WEBHOOK_PATH, WEBHOOK_SECRET, WEBHOOK_URL))
+        return
     try:
-        # Bot token
-        application = Application.builder().token("8513160001:AAELK8YtZxL34U2tWrNsXLOGooJEVSWqKWI").build()
+        application = build_application()
         print("Application built successfully!")
 
-        conv_handler = ConversationHandler(
-            entry_points=[CommandHandler('createpi', create_pi), CallbackQueryHandler(handle_start_over, pattern='^start_over
-    )],
-            states={
-                CUSTOMER: [MessageHandler(filters.TEXT & ~filters.COMMAND, customer_name)],
-                LOCATION_INPUT: [MessageHandler(filters.TEXT & ~filters.COMMAND, location_input)],
-                GRADES: [MessageHandler(filters.TEXT & ~filters.COMMAND, grades)],
-                PRICE: [MessageHandler(filters.TEXT & ~filters.COMMAND, price)],
-                QUANTITY: [MessageHandler(filters.TEXT & ~filters.COMMAND, quantity)],
-                EXTRAS: [MessageHandler(filters.TEXT & ~filters.COMMAND, extras)],
-                CONFIRM: [CallbackQueryHandler(confirm)]
-            },
-            fallbacks=[CommandHandler('cancel', cancel)],
-            per_message=False
-        )
-
-        application.add_handler(conv_handler)
-        application.add_handler(CommandHandler('start', start))
-        application.add_handler(CommandHandler('help', help_command))
-        application.add_handler(CommandHandler('myquotes', myquotes))
-        application.add_handler(CallbackQueryHandler(handle_approval, pattern='^(approve|reject)_'))
-        
         print("✅ Bot started successfully!")
-        print("🤖 Bot is running... Press Ctrl+C to stop.")
-        application.run_polling()
+        if BOT_MODE == 'webhook':
+            print("🤖 Bot is serving webhooks... Press Ctrl+C to stop.")
+            asyncio.run(run_webhook(application, WEBHOOK_HOST, WEBHOOK_PORT, WEBHOOK_PATH, WEBHOOK_SECRET, WEBHOOK_URL))
+        else:
+            print("🤖 Bot is running... Press Ctrl+C to stop.")
+            application.run_polling()
     except Exception as e:
         print(f"❌ Error starting bot: {e}")
         import traceback
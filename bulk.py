@@ -0,0 +1,102 @@
+import io
+import csv
+import zipfile
+from datetime import datetime
+from decimal import InvalidOperation
+from models import LineItem, Quote, match_extras, parse_amount, parse_extras, parse_grades
+
+BULK_COLUMNS = ['customer', 'location', 'grade', 'price', 'quantity', 'extras']
+
+# Upper bounds for one upload, to keep a single batch reviewable and its zip within Telegram's limits
+MAX_BULK_ROWS = 200
+MAX_BULK_FILE_BYTES = 2 * 1024 * 1024
+
+
+class BulkUploadError(Exception):
+    def __init__(self, errors):
+        super().__init__('\n'.join(errors))
+        self.errors = errors
+
+
+def read_rows(filename, data):
+    """Rows of an uploaded CSV or XLSX file as lists of strings, header row included."""
+    try:
+        if filename.lower().endswith('.xlsx'):
+            try:
+                # Imported on first use; it is slow to load and most uploads are CSV
+                import openpyxl
+            except ImportError:
+                raise BulkUploadError(["XLSX upload needs openpyxl on the server; send a CSV instead."])
+            workbook = openpyxl.load_workbook(io.BytesIO(data), read_only=True, data_only=True)
+            try:
+                return [['' if value is None else str(value) for value in row]
+                        for row in workbook.worksheets[0].iter_rows(values_only=True)]
+            finally:
+                workbook.close()
+        return list(csv.reader(io.StringIO(data.decode('utf-8-sig'))))
+    except (ValueError, KeyError, IndexError, csv.Error, zipfile.BadZipFile) as e:
+        # UnicodeDecodeError is a ValueError; openpyxl raises KeyError/BadZipFile on non-XLSX data
+        raise BulkUploadError([f"Could not read {filename}: {e}"])
+
+
+def parse_bulk_quotes(rows, user_id, username, grades_list, extras_list):
+    """Validate every row in one pass and build one quote per row.
+
+    Raises BulkUploadError listing every bad row, so nothing is created from a partly bad file.
+    """
+    rows = iter(rows)
+    header = [name.strip().lower() for name in next(rows, [])]
+    missing = [name for name in BULK_COLUMNS if name not in header]
+    if missing:
+        raise BulkUploadError([f"Missing column(s): {', '.join(missing)}. Expected: {', '.join(BULK_COLUMNS)}"])
+    index = {name: header.index(name) for name in BULK_COLUMNS}
+    created_at = datetime.now().isoformat()
+
+    quotes, errors = [], []
+    for line, row in enumerate(rows, start=2):
+        if not any(cell.strip() for cell in row):
+            continue
+        if len(quotes) + len(errors) >= MAX_BULK_ROWS:
+            raise BulkUploadError([f"Too many rows; at most {MAX_BULK_ROWS} quotes per upload."])
+        values = {name: (row[i].strip() if i < len(row) else '') for name, i in index.items()}
+        problems = []
+        if not values['customer']:
+            problems.append("customer is empty")
+        if not values['location']:
+            problems.append("location is empty")
+        grades, invalid = parse_grades(values['grade'], grades_list)
+        if invalid or len(grades) != 1:
+            problems.append(f"unknown grade {values['grade']!r}")
+        amounts = {}
+        for name in ('price', 'quantity'):
+            try:
+                amounts[name] = parse_amount(values[name])
+            except ValueError:
+                problems.append(f"invalid {name} {values[name]!r}")
+        extras, unknown = match_extras(parse_extras(values['extras'].replace(';', ',')), extras_list)
+        problems.extend(f"unknown extra {extra!r}" for extra in unknown)
+        if problems:
+            errors.append(f"Row {line}: {'; '.join(problems)}")
+            continue
+        try:
+            quotes.append(Quote(
+                user_id, username, values['customer'], values['location'],
+                [LineItem(grades[0], amounts['price'], amounts['quantity'])],
+                ', '.join(extras) or 'None', created_at
+            ))
+        except InvalidOperation:
+            errors.append(f"Row {line}: the total is too large")
+    if errors:
+        raise BulkUploadError(errors)
+    if not quotes:
+        raise BulkUploadError(["The file has no quote rows."])
+    return quotes
+
+
+def zip_pdfs(pdfs):
+    """Zip {quote_number: pdf bytes} into one archive."""
+    buffer = io.BytesIO()
+    with zipfile.ZipFile(buffer, 'w', zipfile.ZIP_DEFLATED) as archive:
+        for quote_number, data in pdfs.items():
+            archive.writestr(f"Quote_{quote_number}.pdf", data)
+    return buffer.getvalue()
@@ -0,0 +1,134 @@
+import os
+import heapq
+from datetime import datetime, timedelta
+from models import OPEN_STATUSES
+
+# Days a quote is valid from its date of issue, as printed on the PDF
+QUOTE_VALID_DAYS = float(os.environ.get('QUOTE_VALID_DAYS', '3'))
+VALIDITY = f"{QUOTE_VALID_DAYS:g} day{'' if QUOTE_VALID_DAYS == 1 else 's'}"
+# One reminder goes out this many hours before a quote expires; 0 sends none
+EXPIRY_REMINDER_HOURS = float(os.environ.get('EXPIRY_REMINDER_HOURS', '12'))
+# Quotes that expired longer ago than this, e.g. by the first start with expiry, are closed
+# without telling anyone
+LATE_EXPIRY = timedelta(days=1)
+
+
+def expires_at(quote):
+    """When a pending or approved quote expires: its validity counted from approval, or from creation while pending."""
+    issued = quote.approved_at if quote.status == 'approved' else quote.created_at
+    if quote.status not in OPEN_STATUSES or not issued:
+        return None
+    return datetime.fromisoformat(issued) + timedelta(days=QUOTE_VALID_DAYS)
+
+
+def deadlines(quote):
+    """(when, quote_number, kind) heap entries for a quote, kind being 'remind' or 'expire'."""
+    expires = expires_at(quote)
+    if expires is None:
+        return []
+    entries = [(expires, quote.quote_number, 'expire')]
+    if EXPIRY_REMINDER_HOURS and not quote.reminded_at:
+        entries.append((expires - timedelta(hours=EXPIRY_REMINDER_HOURS), quote.quote_number, 'remind'))
+    return entries
+
+
+class ExpiryScheduler:
+    """Min-heap of reminder and expiry deadlines, with a single job on the application's job
+    queue set for the earliest one.
+
+    The heap is built once at startup; after that a quote's deadlines are pushed when it is
+    created or approved. Entries are never removed early: when one comes up, the quote is read
+    again and the entry skipped unless it still matches, e.g. after the quote was decided.
+    Everything due at once, such as a bulk upload, is written together and reported with a single
+    notify(context, reminded, expired) call, each list holding (quote, status before, expires).
+    """
+
+    def __init__(self, store, notify):
+        self.store = store
+        self.notify = notify
+        self._heap = []
+        self._job_queue = None
+        self._job = None
+        self._job_at = None
+
+    def __len__(self):
+        return len(self._heap)
+
+    def start(self, job_queue, quotes):
+        """Heapify the deadlines of the given open quotes in one pass and schedule the first."""
+        self._job_queue = job_queue
+        self._heap = [entry for quote in quotes for entry in deadlines(quote)]
+        heapq.heapify(self._heap)
+        self._schedule()
+
+    def add(self, quote):
+        """Push the deadlines of a quote that was just created or approved."""
+        if self._job_queue is None:
+            # Not started yet; start() reads the quote from the store
+            return
+        for entry in deadlines(quote):
+            heapq.heappush(self._heap, entry)
+        self._schedule()
+
+    def _schedule(self):
+        if self._job_queue is None or not self._heap:
+            return
+        when = self._heap[0][0]
+        if self._job is not None:
+            if self._job_at <= when:
+                return
+            self._job.schedule_removal()
+        # Seconds rather than a datetime: quote times are naive local time, the job queue's are UTC
+        delay = max(0, (when - datetime.now()).total_seconds())
+        self._job = self._job_queue.run_once(self._run, delay, name='quote_expiry')
+        self._job_at = when
+
+    def _write(self, due, **fields):
+        """Apply fields to {quote_number: (quote, expires)} with one store write per status.
+
+        Returns (quote, status before, expires) for the quotes that were still in that status.
+        """
+        written = []
+        for status in OPEN_STATUSES:
+            group = {qn: (quote, expires) for qn, (quote, expires) in due.items() if quote.status == status}
+            if not group:
+                continue
+            for quote in self.store.update_quotes({qn: fields for qn in group}, expected_status=status):
+                written.append((quote, status, group[quote.quote_number][1]))
+        return written
+
+    async def _run(self, context):
+        self._job = None
+        now = datetime.now()
+        reminders, expiries = {}, {}
+        while self._heap and self._heap[0][0] <= now:
+            entry = heapq.heappop(self._heap)
+            quote = self.store.get_quote(entry[1])
+            if quote is None or entry not in deadlines(quote):
+                continue
+            expires = expires_at(quote)
+            if entry[2] == 'expire':
+                expiries[quote.quote_number] = (quote, expires)
+            # A quote that was already overdue at startup just expires, without a reminder first
+            elif expires > now:
+                reminders[quote.quote_number] = (quote, expires)
+        try:
+            reminded = self._write(reminders, reminded_at=now.isoformat())
+            expired = self._write(expiries, status='expired', expired_at=now.isoformat())
+            if reminded or expired:
+                # On disk before anyone is told, so a restart doesn't send it again
+                await self.store.flush()
+        except Exception as e:
+            print(f"Failed to record {len(reminders)} reminders and {len(expiries)} expiries: {e}")
+            self._schedule()
+            return
+        late = [item for item in expired if now - item[2] > LATE_EXPIRY]
+        if late:
+            print(f"Expired {len(late)} quotes that were overdue by more than {LATE_EXPIRY.days} day(s)")
+            expired = [item for item in expired if now - item[2] <= LATE_EXPIRY]
+        if reminded or expired:
+            try:
+                await self.notify(context, reminded, expired)
+            except Exception as e:
+                print(f"Failed to send {len(reminded)} reminders and {len(expired)} expiries: {e}")
+        self._schedule()
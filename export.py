@@ -0,0 +1,53 @@
+import csv
+
+EXPORT_COLUMNS = [
+    'Quote No', 'Created', 'Status', 'Customer', 'Location', 'Requested By', 'User ID', 'Grades',
+    'Total Quantity (m³)', 'Subtotal', 'VAT (15%)', 'Grand Total', 'Extras',
+    'Approved By', 'Approved At', 'Rejected By', 'Rejected At',
+]
+
+
+def quote_row(quote):
+    grades = '; '.join(f"{item.grade}: {item.quantity} m³ × {item.unit_price}" for item in quote.items)
+    return [
+        quote.quote_number, quote.created_at, quote.status, quote.customer, quote.location,
+        quote.username, quote.user_id, grades,
+        quote.total_quantity, quote.subtotal, quote.vat, quote.grand_total, quote.extras,
+        quote.approved_by, quote.approved_at, quote.rejected_by, quote.rejected_at,
+    ]
+
+
+def write_csv(quotes, path):
+    """Write quotes to a CSV file one row at a time; returns the number of quotes written."""
+    count = 0
+    # utf-8-sig so Excel shows the m³ and × characters correctly
+    with open(path, 'w', newline='', encoding='utf-8-sig') as f:
+        writer = csv.writer(f)
+        writer.writerow(EXPORT_COLUMNS)
+        for quote in quotes:
+            writer.writerow(quote_row(quote))
+            count += 1
+    return count
+
+
+def write_xlsx(quotes, path):
+    """Write quotes to an XLSX file with openpyxl's streaming writer; returns the number written."""
+    try:
+        # Imported on first use: it is slow to load and only XLSX needs it. CSV needs nothing
+        # beyond the standard library.
+        import openpyxl
+    except ImportError:
+        raise RuntimeError("XLSX export needs openpyxl (pip install openpyxl)")
+    count = 0
+    # write_only mode streams rows to disk instead of keeping the sheet in memory
+    workbook = openpyxl.Workbook(write_only=True)
+    sheet = workbook.create_sheet('Quotes')
+    sheet.append(EXPORT_COLUMNS)
+    for quote in quotes:
+        sheet.append(quote_row(quote))
+        count += 1
+    workbook.save(path)
+    return count
+
+
+EXPORT_WRITERS = {'csv': write_csv, 'xlsx': write_xlsx}
@@ -0,0 +1,97 @@
+import time
+import asyncio
+from datetime import timedelta
+from telegram.error import BadRequest, NetworkError, RetryAfter
+
+# Telegram allows about 30 messages per second overall and about 1 per second to the same chat
+GLOBAL_RATE = 30
+PER_CHAT_RATE = 1
+
+SEND_ATTEMPTS = 4
+
+
+class TokenBucket:
+    def __init__(self, rate, capacity):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated = time.monotonic()
+        self._lock = asyncio.Lock()
+
+    def _refill(self):
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    async def acquire(self):
+        async with self._lock:
+            self._refill()
+            while self.tokens < 1:
+                await asyncio.sleep((1 - self.tokens) / self.rate)
+                self._refill()
+            self.tokens -= 1
+
+    def is_full(self):
+        self._refill()
+        return self.tokens >= self.capacity
+
+
+class SendLimiter:
+    """Token buckets for Telegram's global and per-chat send limits."""
+
+    def __init__(self, global_rate=GLOBAL_RATE, per_chat_rate=PER_CHAT_RATE):
+        self.per_chat_rate = per_chat_rate
+        self._global = TokenBucket(global_rate, global_rate)
+        self._chats = {}
+
+    async def acquire(self, chat_id):
+        bucket = self._chats.get(chat_id)
+        if bucket is None:
+            if len(self._chats) > 1000:
+                # Idle chats have full buckets and carry no state worth keeping
+                self._chats = {c: b for c, b in self._chats.items() if not b.is_full()}
+            bucket = self._chats[chat_id] = TokenBucket(self.per_chat_rate, 1)
+        await bucket.acquire()
+        await self._global.acquire()
+
+
+async def send_with_retry(limiter, chat_id, send, attempts=SEND_ATTEMPTS):
+    """Call send() under the limiter, waiting out RetryAfter and backing off on network errors."""
+    for attempt in range(attempts):
+        await limiter.acquire(chat_id)
+        try:
+            return await send()
+        except RetryAfter as e:
+            if attempt == attempts - 1:
+                raise
+            delay = e.retry_after
+            if isinstance(delay, timedelta):
+                delay = delay.total_seconds()
+            await asyncio.sleep(delay)
+        except BadRequest:
+            # Retrying will not fix a bad request
+            raise
+        except NetworkError:
+            if attempt == attempts - 1:
+                raise
+            await asyncio.sleep(2 ** attempt)
+
+
+async def fan_out(limiter, chat_ids, send):
+    """Run send(chat_id) for every chat concurrently.
+
+    Returns (results, failures): the result per chat that succeeded and the exception per chat
+    that failed, so one slow or broken chat does not hold up or hide the others.
+    """
+    chat_ids = list(chat_ids)
+    outcomes = await asyncio.gather(
+        *(send_with_retry(limiter, chat_id, lambda chat_id=chat_id: send(chat_id)) for chat_id in chat_ids),
+        return_exceptions=True
+    )
+    results, failures = {}, {}
+    for chat_id, outcome in zip(chat_ids, outcomes):
+        if isinstance(outcome, Exception):
+            failures[chat_id] = outcome
+        else:
+            results[chat_id] = outcome
+    return results, failures
@@ -0,0 +1,156 @@
+import os
+import time
+import asyncio
+from collections import OrderedDict, deque
+from metrics import metrics
+
+# Job priorities; lower runs first
+INTERACTIVE = 0
+BULK = 1
+PRIORITY_NAMES = ['interactive', 'bulk']
+
+# PDF and send jobs running at once, and jobs allowed to wait for them
+JOB_WORKERS = int(os.environ.get('JOB_WORKERS', '8'))
+JOB_QUEUE_SIZE = int(os.environ.get('JOB_QUEUE_SIZE', '200'))
+
+
+class JobQueueFull(Exception):
+    pass
+
+
+class Job:
+    """A queued coroutine function; await the job for its result."""
+
+    def __init__(self, run, owner, priority):
+        self.run = run
+        self.owner = owner
+        self.priority = priority
+        self.queued_at = time.perf_counter()
+        # 1-based place in the queue when submitted, 0 if a worker was free for it
+        self.position = 0
+        self.future = asyncio.get_running_loop().create_future()
+        # The submitter may be gone (e.g. its handler was cancelled); don't warn about unseen exceptions
+        self.future.add_done_callback(lambda future: future.cancelled() or future.exception())
+
+    def __await__(self):
+        return self.future.__await__()
+
+
+class JobQueue:
+    """Bounded queue for PDF rendering and sending, run by a fixed number of worker tasks.
+
+    Interactive jobs (a single approval, a PDF download) always go before bulk ones. Within a
+    priority, owners take turns, so one admin's 200-quote approval doesn't hold up everybody
+    else's. When the queue is full, submit() either raises JobQueueFull or, with wait=True,
+    waits for room, which slows a bulk producer down to the pace of the workers.
+    """
+
+    def __init__(self, workers=JOB_WORKERS, capacity=JOB_QUEUE_SIZE):
+        self.workers = workers
+        self.capacity = capacity
+        # Per priority: owner -> their jobs, owners in the order they are served
+        self._queues = [OrderedDict() for _ in PRIORITY_NAMES]
+        self._size = 0
+        self._running = 0
+        self._closing = False
+        self._changed = None
+        self._tasks = []
+        metrics.gauge('job_queue_depth', lambda: [
+            ({'priority': name}, sum(len(jobs) for jobs in queue.values()))
+            for name, queue in zip(PRIORITY_NAMES, self._queues)
+        ])
+        metrics.gauge('jobs_running', lambda: self._running)
+
+    @property
+    def size(self):
+        return self._size
+
+    def start(self):
+        """Start the workers; submit() does this on first use."""
+        self._closing = False
+        self._changed = asyncio.Condition()
+        self._tasks = [asyncio.create_task(self._work()) for _ in range(self.workers)]
+
+    async def stop(self):
+        """Run the jobs still queued, then stop the workers."""
+        if not self._tasks:
+            return
+        async with self._changed:
+            self._closing = True
+            self._changed.notify_all()
+        await asyncio.gather(*self._tasks)
+        self._tasks = []
+
+    def _jobs_ahead(self, owner, priority):
+        ahead = sum(len(jobs) for queue in self._queues[:priority] for jobs in queue.values())
+        queue = self._queues[priority]
+        # Owners take turns: k jobs of our own already queued means we run in round k
+        own = len(queue.get(owner, ()))
+        ahead += own
+        before = True
+        for other, jobs in queue.items():
+            if other == owner:
+                before = False
+                continue
+            ahead += min(len(jobs), own + 1 if before else own)
+        return ahead
+
+    def position(self, owner, priority=INTERACTIVE):
+        """Where a job submitted now would wait: 1-based place in the queue, or 0 if it would start at once."""
+        ahead = self._jobs_ahead(owner, priority)
+        return ahead + 1 if ahead + self._running >= self.workers else 0
+
+    async def submit(self, run, owner, priority=INTERACTIVE, wait=False):
+        """Queue run(), a coroutine function, on behalf of owner (a user id). Returns the Job."""
+        if not self._tasks:
+            self.start()
+        async with self._changed:
+            if self._size >= self.capacity:
+                if not wait:
+                    metrics.inc('jobs_rejected_total', priority=PRIORITY_NAMES[priority])
+                    raise JobQueueFull()
+                await self._changed.wait_for(lambda: self._size < self.capacity)
+            job = Job(run, owner, priority)
+            job.position = self.position(owner, priority)
+            self._queues[priority].setdefault(owner, deque()).append(job)
+            self._size += 1
+            self._changed.notify_all()
+        return job
+
+    def _next_job(self):
+        for queue in self._queues:
+            if queue:
+                owner, jobs = next(iter(queue.items()))
+                job = jobs.popleft()
+                # To the back of the line, or out of it if that was their last job
+                del queue[owner]
+                if jobs:
+                    queue[owner] = jobs
+                self._size -= 1
+                return job
+
+    async def _work(self):
+        while True:
+            async with self._changed:
+                await self._changed.wait_for(lambda: self._size or self._closing)
+                if not self._size:
+                    return
+                job = self._next_job()
+                self._changed.notify_all()
+            metrics.observe('job_wait_seconds', time.perf_counter() - job.queued_at,
+                            priority=PRIORITY_NAMES[job.priority])
+            self._running += 1
+            try:
+                result = await job.run()
+            except asyncio.CancelledError:
+                job.future.cancel()
+                raise
+            except Exception as e:
+                # Done already if the submitter was cancelled, which cancels the future it awaited
+                if not job.future.done():
+                    job.future.set_exception(e)
+            else:
+                if not job.future.done():
+                    job.future.set_result(result)
+            finally:
+                self._running -= 1
@@ -0,0 +1,246 @@
+"""Load test: N simulated users run the whole /createpi flow, and an admin approves each quote.
+
+The real Application and handlers from bot.py run against an in-process fake Bot API, so
+nothing reaches Telegram. Reports per-step latency percentiles, PDF throughput and event
+loop lag. Runs in a temporary directory so the real quote store is never touched.
+
+    python loadtest.py --users 50 --api-latency 40
+"""
+import os
+import sys
+import json
+import time
+import shutil
+import asyncio
+import argparse
+import tempfile
+import itertools
+from telegram import Update
+from telegram.request import BaseRequest
+
+# Each step: label, what the user sends, the Bot API method that answers it
+STEPS = [
+    ('/createpi', '/createpi', 'sendMessage'),
+    ('customer', 'Acme Construction', 'sendMessage'),
+    ('location', 'Bole, Addis Ababa', 'sendMessage'),
+    ('grades', 'C-25, C-30', 'sendMessage'),
+    ('price C-25', '4,500', 'sendMessage'),
+    ('quantity C-25', '30', 'sendMessage'),
+    ('price C-30', '5200', 'sendMessage'),
+    ('quantity C-30', '12.5', 'sendMessage'),
+    ('extras', 'Elephant pump, Vibrator', 'sendMessage'),
+    ('confirm', 'cb:confirm_yes', 'editMessageText'),
+]
+
+STEP_TIMEOUT = 120
+FIRST_USER_ID = 10_000_000
+
+
+class FakeBotAPI(BaseRequest):
+    """Answers Bot API calls locally after a fixed delay and tells waiting users what was sent to them."""
+
+    def __init__(self, latency):
+        self.latency = latency
+        self.calls = 0
+        self.documents = 0
+        self._ids = itertools.count(1)
+        self._inboxes = {}
+
+    def inbox(self, chat_id):
+        return self._inboxes.setdefault(chat_id, asyncio.Queue())
+
+    @property
+    def read_timeout(self):
+        return STEP_TIMEOUT
+
+    async def initialize(self):
+        pass
+
+    async def shutdown(self):
+        pass
+
+    async def do_request(self, url, method, request_data=None, **kwargs):
+        await asyncio.sleep(self.latency)
+        self.calls += 1
+        name = url.rsplit('/', 1)[-1]
+        params = request_data.parameters if request_data else {}
+        chat_id = params.get('chat_id')
+        if name == 'getMe':
+            result = {'id': 1, 'is_bot': True, 'first_name': 'LoadTest', 'username': 'loadtest_bot'}
+        elif name in ('sendMessage', 'sendDocument', 'editMessageText'):
+            result = {
+                'message_id': next(self._ids),
+                'date': int(time.time()),
+                'chat': {'id': chat_id, 'type': 'private'},
+                'text': params.get('text', ''),
+            }
+            if name == 'sendDocument':
+                self.documents += 1
+                result['document'] = {'file_id': f'FILE{result["message_id"]}', 'file_unique_id': f'U{result["message_id"]}'}
+        else:
+            result = True
+        if chat_id is not None:
+            self.inbox(chat_id).put_nowait(name)
+        return 200, json.dumps({'ok': True, 'result': result}).encode()
+
+
+class UpdateFactory:
+    def __init__(self):
+        self._ids = itertools.count(1)
+
+    def _user(self, user_id):
+        return {'id': user_id, 'is_bot': False, 'first_name': f'User{user_id}', 'username': f'user{user_id}'}
+
+    def message(self, user_id, text):
+        message = {
+            'message_id': next(self._ids),
+            'date': int(time.time()),
+            'chat': {'id': user_id, 'type': 'private'},
+            'from': self._user(user_id),
+            'text': text,
+        }
+        if text.startswith('/'):
+            message['entities'] = [{'type': 'bot_command', 'offset': 0, 'length': len(text.split()[0])}]
+        return {'update_id': next(self._ids), 'message': message}
+
+    def callback(self, user_id, data, text=''):
+        message = {
+            'message_id': next(self._ids),
+            'date': int(time.time()),
+            'chat': {'id': user_id, 'type': 'private'},
+            'from': {'id': 1, 'is_bot': True, 'first_name': 'LoadTest'},
+            'text': text,
+        }
+        return {'update_id': next(self._ids), 'callback_query': {
+            'id': str(next(self._ids)), 'from': self._user(user_id), 'chat_instance': str(user_id), 'data': data, 'message': message,
+        }}
+
+
+def percentile(values, p):
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, max(0, round(p / 100 * len(ordered)) - 1))]
+
+
+async def measure_loop_lag(samples, interval=0.01):
+    while True:
+        started = time.perf_counter()
+        await asyncio.sleep(interval)
+        samples.append(time.perf_counter() - started - interval)
+
+
+async def run(args):
+    # No metrics endpoint unless asked for; a running bot may hold the port
+    os.environ.setdefault('METRICS_PORT', '0')
+    import bot
+    from fanout import SendLimiter
+
+    if not args.telegram_limits:
+        # The fake API has no rate limits; measure the bot, not the limiter
+        bot.send_limiter = SendLimiter(global_rate=1_000_000, per_chat_rate=1_000_000)
+
+    api = FakeBotAPI(args.api_latency / 1000)
+    application = bot.build_application(request=api)
+    updates = UpdateFactory()
+    admin_id = bot.ADMIN_IDS[0]
+    latencies = {label: [] for label, _, _ in STEPS}
+    latencies['approval → PDF'] = []
+    failures = []
+
+    async def step(chat_id, update, expected):
+        inbox = api.inbox(chat_id)
+        while not inbox.empty():
+            inbox.get_nowait()
+        started = time.perf_counter()
+        await application.update_queue.put(Update.de_json(update, application.bot))
+        while await asyncio.wait_for(inbox.get(), STEP_TIMEOUT) != expected:
+            pass
+        return time.perf_counter() - started
+
+    async def user_flow(user_id):
+        try:
+            for label, text, expected in STEPS:
+                if text.startswith('cb:'):
+                    update = updates.callback(user_id, text[3:])
+                else:
+                    update = updates.message(user_id, text)
+                latencies[label].append(await step(user_id, update, expected))
+                if args.think:
+                    await asyncio.sleep(args.think / 1000)
+            quote_number = bot.store.list_by_user(user_id, limit=1)[0].quote_number
+            # The admin's click is answered in the admin chat; the PDF goes to the user
+            approve = updates.callback(admin_id, f'approve_{quote_number}', text=f'Quote: {quote_number}')
+            latencies['approval → PDF'].append(await step(user_id, approve, 'sendDocument'))
+        except Exception as e:
+            failures.append((user_id, repr(e)))
+
+    lag_samples = []
+    await application.initialize()
+    # Background store writer and loading, PDF renderer warm-up, startup time
+    await bot.post_init(application)
+    await application.start()
+    lag_task = asyncio.create_task(measure_loop_lag(lag_samples))
+    started = time.perf_counter()
+    try:
+        users = []
+        for i in range(args.users):
+            users.append(asyncio.create_task(user_flow(FIRST_USER_ID + i)))
+            if args.ramp:
+                await asyncio.sleep(args.ramp / args.users)
+        await asyncio.gather(*users)
+        elapsed = time.perf_counter() - started
+    finally:
+        lag_task.cancel()
+        await application.stop()
+        await application.shutdown()
+        await bot.post_shutdown(application)
+
+    print(f"\n{args.users} users, {sum(len(v) for v in latencies.values())} steps in {elapsed:.2f}s "
+          f"({api.calls} Bot API calls, {args.api_latency:g} ms simulated latency)\n")
+    print(f"{'step':<18}{'n':>6}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}{'max ms':>10}")
+    worst_p95 = 0
+    for label, values in latencies.items():
+        ms = [v * 1000 for v in values]
+        worst_p95 = max(worst_p95, percentile(ms, 95))
+        print(f"{label:<18}{len(ms):>6}{percentile(ms, 50):>10.1f}{percentile(ms, 95):>10.1f}{percentile(ms, 99):>10.1f}{max(ms, default=0):>10.1f}")
+    print(f"\nPDFs sent: {api.documents} ({api.documents / elapsed:.2f}/s)")
+    lag = [v * 1000 for v in lag_samples]
+    print(f"Event loop lag: p50 {percentile(lag, 50):.1f} ms, p95 {percentile(lag, 95):.1f} ms, "
+          f"p99 {percentile(lag, 99):.1f} ms, max {max(lag, default=0):.1f} ms")
+
+    if failures:
+        print(f"\n❌ {len(failures)} user flows failed, first: {failures[0]}")
+        return 1
+    if args.max_p95 and worst_p95 > args.max_p95:
+        print(f"\n❌ Slowest step p95 {worst_p95:.1f} ms is over the {args.max_p95:g} ms limit")
+        return 1
+    return 0
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('--users', type=int, default=50, help='simulated users running the flow at once')
+    parser.add_argument('--api-latency', type=float, default=40, help='simulated Bot API round trip in ms')
+    parser.add_argument('--think', type=float, default=0, help='pause between a user\'s steps in ms')
+    parser.add_argument('--ramp', type=float, default=0, help='seconds over which users are started')
+    parser.add_argument('--telegram-limits', action='store_true', help='keep the per-chat and global send limits')
+    parser.add_argument('--max-p95', type=float, default=0, help='exit non-zero if any step\'s p95 exceeds this many ms')
+    args = parser.parse_args()
+
+    package_dir = os.path.dirname(os.path.abspath(__file__))
+    work_dir = tempfile.mkdtemp(prefix='loadtest-')
+    for name in ('logo.png', 'signature.png'):
+        if os.path.exists(os.path.join(package_dir, name)):
+            shutil.copy(os.path.join(package_dir, name), work_dir)
+    # bot opens its quote store in the working directory on import
+    os.chdir(work_dir)
+    sys.path.insert(0, package_dir)
+    try:
+        return asyncio.run(run(args))
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+
+if __name__ == '__main__':
+    sys.exit(main())
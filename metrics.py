@@ -0,0 +1,182 @@
+import re
+import time
+import functools
+from contextlib import contextmanager
+from telegram.request import BaseRequest
+
+# Seconds; spans quick handler replies up to PDF renders under load
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30)
+
+PREFIX = 'concrete_bot_'
+
+HELP = {
+    'handler_seconds': ('histogram', 'Time spent in each update handler'),
+    'handler_errors_total': ('counter', 'Update handlers that raised'),
+    'bot_api_seconds': ('histogram', 'Outbound Bot API request latency by method'),
+    'bot_api_errors_total': ('counter', 'Bot API requests that failed or got an error status'),
+    'pdf_render_seconds': ('histogram', 'Time to render a quote PDF in the executor'),
+    'pdf_queue_wait_seconds': ('histogram', 'Time a PDF render waited for a free worker'),
+    'pdf_cache_requests_total': ('counter', 'PDF cache lookups by result'),
+    'store_write_seconds': ('histogram', 'Time to write a quote change'),
+    'store_sync_seconds': ('histogram', 'Time to fsync the quote journal, write a snapshot or checkpoint SQLite'),
+    'job_wait_seconds': ('histogram', 'Time a PDF or send job waited in the job queue'),
+    'jobs_rejected_total': ('counter', 'Jobs turned away because the job queue was full'),
+    'job_queue_depth': ('gauge', 'PDF and send jobs waiting, by priority'),
+    'jobs_running': ('gauge', 'PDF and send jobs being worked on'),
+    'pdf_queue_depth': ('gauge', 'PDF renders running or waiting for a worker'),
+    'startup_seconds': ('gauge', 'Seconds from process start until the bot was ready for updates'),
+    'conversations': ('gauge', 'Open /createpi conversations by state, as of the last persistence flush'),
+}
+
+
+class Histogram:
+    def __init__(self, buckets=LATENCY_BUCKETS):
+        self.buckets = buckets
+        self.counts = [0] * len(buckets)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value):
+        self.sum += value
+        self.count += 1
+        for i, bound in enumerate(self.buckets):
+            if value <= bound:
+                self.counts[i] += 1
+                break
+
+
+def _labels(labels, **extra):
+    labels = {**dict(labels), **extra}
+    if not labels:
+        return ''
+    return '{' + ','.join(f'{k}="{v}"' for k, v in sorted(labels.items())) + '}'
+
+
+class Metrics:
+    """In-process metrics rendered in the Prometheus text format.
+
+    Everything runs on the event loop or under the GIL with simple increments, so no locking.
+    Gauges are functions evaluated at scrape time.
+    """
+
+    def __init__(self):
+        self._histograms = {}
+        self._counters = {}
+        self._gauges = {}
+
+    def observe(self, name, value, **labels):
+        key = (name, tuple(sorted(labels.items())))
+        histogram = self._histograms.get(key)
+        if histogram is None:
+            histogram = self._histograms[key] = Histogram()
+        histogram.observe(value)
+
+    def inc(self, name, amount=1, **labels):
+        key = (name, tuple(sorted(labels.items())))
+        self._counters[key] = self._counters.get(key, 0) + amount
+
+    def gauge(self, name, read):
+        """read() returns a number, or a list of (labels dict, number) pairs."""
+        self._gauges[name] = read
+
+    @contextmanager
+    def timer(self, name, **labels):
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(name, time.perf_counter() - started, **labels)
+
+    def render(self):
+        lines = []
+        for name, (kind, help_text) in HELP.items():
+            if kind == 'histogram':
+                series = [(labels, h) for (n, labels), h in self._histograms.items() if n == name]
+            elif kind == 'counter':
+                series = [(labels, v) for (n, labels), v in self._counters.items() if n == name]
+            else:
+                read = self._gauges.get(name)
+                if read is None:
+                    continue
+                value = read()
+                series = value if isinstance(value, list) else [({}, value)]
+                series = [(tuple(labels.items()), v) for labels, v in series]
+            lines.append(f'# HELP {PREFIX}{name} {help_text}')
+            lines.append(f'# TYPE {PREFIX}{name} {kind}')
+            for labels, value in series:
+                if kind != 'histogram':
+                    lines.append(f'{PREFIX}{name}{_labels(labels)} {value}')
+                    continue
+                cumulative = 0
+                for bound, count in zip(value.buckets, value.counts):
+                    cumulative += count
+                    lines.append(f'{PREFIX}{name}_bucket{_labels(labels, le=bound)} {cumulative}')
+                lines.append(f'{PREFIX}{name}_bucket{_labels(labels, le="+Inf")} {value.count}')
+                lines.append(f'{PREFIX}{name}_sum{_labels(labels)} {value.sum:.6f}')
+                lines.append(f'{PREFIX}{name}_count{_labels(labels)} {value.count}')
+        return '\n'.join(lines) + '\n'
+
+
+metrics = Metrics()
+
+
+def instrumented(handler):
+    """Record latency and errors of an update handler under its function name."""
+    name = handler.__name__
+
+    @functools.wraps(handler)
+    async def wrapper(update, context):
+        started = time.perf_counter()
+        try:
+            return await handler(update, context)
+        except Exception:
+            metrics.inc('handler_errors_total', handler=name)
+            raise
+        finally:
+            metrics.observe('handler_seconds', time.perf_counter() - started, handler=name)
+
+    return wrapper
+
+
+# The method of a Bot API URL, .../bot<token>/<method>; downloads use .../file/bot<token>/<path>
+API_METHOD = re.compile(r'(?<!/file)/bot[^/]+/(\w+)$')
+
+
+class InstrumentedRequest(BaseRequest):
+    """Wraps the Bot API transport to time every request by method."""
+
+    def __init__(self, request):
+        self.request = request
+
+    @property
+    def read_timeout(self):
+        return self.request.read_timeout
+
+    async def initialize(self):
+        await self.request.initialize()
+
+    async def shutdown(self):
+        await self.request.shutdown()
+
+    async def do_request(self, url, method, request_data=None, **kwargs):
+        # Only Bot API calls are labelled by method; file downloads carry the file path in the URL
+        match = API_METHOD.search(url)
+        api_method = match.group(1) if match else 'file'
+        started = time.perf_counter()
+        try:
+            code, payload = await self.request.do_request(url, method, request_data=request_data, **kwargs)
+        except Exception:
+            metrics.inc('bot_api_errors_total', method=api_method)
+            raise
+        finally:
+            metrics.observe('bot_api_seconds', time.perf_counter() - started, method=api_method)
+        if code >= 400:
+            metrics.inc('bot_api_errors_total', method=api_method)
+        return code, payload
+
+
+def metrics_routes():
+    async def scrape(request):
+        return 200, 'text/plain; version=0.0.4; charset=utf-8', metrics.render().encode()
+
+    return {('GET', '/metrics'): scrape}
@@ -0,0 +1,159 @@
+import re
+from decimal import Decimal, ROUND_HALF_UP
+
+VAT_RATE = Decimal('0.15')
+CENTS = Decimal('0.01')
+# Largest price or quantity accepted; keeps every total well inside Decimal's 28 digits
+MAX_AMOUNT = Decimal('1000000000')
+# Plain digits with an optional decimal point, once thousands separators are removed
+AMOUNT = re.compile(r'[0-9]+\.?[0-9]*|\.[0-9]+')
+# Quotes that can still expire
+OPEN_STATUSES = ('pending', 'approved')
+
+
+def to_decimal(value):
+    # str() first so legacy float values keep the digits the user typed
+    return value if isinstance(value, Decimal) else Decimal(str(value))
+
+
+def parse_amount(text):
+    """Parse a price or quantity typed by the user, e.g. '4,500'. Raises ValueError."""
+    digits = text.replace(',', '').strip()
+    if not AMOUNT.fullmatch(digits):
+        raise ValueError(f"not a number: {text!r}")
+    value = Decimal(digits)
+    if value > MAX_AMOUNT:
+        raise ValueError(f"too large: {text!r}")
+    return value
+
+
+def parse_grades(text, grades_list):
+    """Grades from a comma separated list such as 'C-25, c-30'.
+
+    Returns (valid, invalid); valid keeps the order typed and drops repeats.
+    """
+    valid, invalid = [], []
+    for grade in text.replace(' ', '').upper().split(','):
+        if not grade:
+            continue
+        if grade not in grades_list:
+            invalid.append(grade)
+        elif grade not in valid:
+            valid.append(grade)
+    return valid, invalid
+
+
+def parse_extras(text):
+    """Extra services from a comma separated list, leaving out empty and 'None' entries."""
+    return [extra.strip() for extra in text.split(',') if extra.strip() and extra.strip().lower() != 'none']
+
+
+def match_extras(names, extras_list):
+    """Map typed extras onto extras_list ignoring case; returns (extras, unknown).
+
+    A single word also matches when it names exactly one extra, e.g. 'pump' for 'Elephant pump'.
+    """
+    known = {extra.lower(): extra for extra in extras_list if extra != 'None'}
+    extras, unknown = [], []
+    for name in names:
+        matches = [known[name.lower()]] if name.lower() in known else [
+            extra for key, extra in known.items() if name.lower() in key.split()
+        ]
+        if len(matches) == 1:
+            extras.append(matches[0])
+        else:
+            unknown.append(name)
+    return extras, unknown
+
+
+class LineItem:
+    __slots__ = ('grade', 'unit_price', 'quantity', 'total')
+
+    def __init__(self, grade, unit_price, quantity):
+        self.grade = grade
+        self.unit_price = to_decimal(unit_price)
+        self.quantity = to_decimal(quantity)
+        self.total = self.unit_price * self.quantity
+
+
+class Quote:
+    """A price quote with its line items and totals.
+
+    Totals are computed once, with Decimal arithmetic, when the quote is created. to_dict()
+    stores line items as [grade, price, quantity] rows instead of the grades list plus the
+    unit_price and quantity dicts that drafts use; from_dict() reads either form.
+    """
+
+    __slots__ = (
+        'quote_number', 'user_id', 'username', 'customer', 'location', 'items', 'extras',
+        'status', 'created_at', 'approved_by', 'approved_at', 'rejected_by', 'rejected_at',
+        'pdf_file_id', 'pdf_key', 'admin_messages', 'batch_messages', 'reminded_at', 'expired_at',
+        'total_quantity', 'subtotal', 'vat', 'grand_total',
+    )
+
+    # Workflow fields that are only stored when set; a bulk upload's admin notifications are
+    # batch_messages on its first quote, apart from that quote's own admin_messages
+    OPTIONAL_FIELDS = (
+        'approved_by', 'approved_at', 'rejected_by', 'rejected_at', 'pdf_file_id', 'pdf_key', 'admin_messages',
+        'batch_messages', 'reminded_at', 'expired_at',
+    )
+
+    def __init__(self, user_id, username, customer, location, items, extras, created_at,
+                 quote_number=None, status='pending', **fields):
+        self.quote_number = quote_number
+        self.user_id = user_id
+        self.username = username
+        self.customer = customer
+        self.location = location
+        self.items = items
+        self.extras = extras
+        self.status = status
+        self.created_at = created_at
+        for name in self.OPTIONAL_FIELDS:
+            setattr(self, name, fields.get(name))
+        self.total_quantity = sum((item.quantity for item in items), Decimal(0))
+        self.subtotal = sum((item.total for item in items), Decimal(0))
+        self.vat = (self.subtotal * VAT_RATE).quantize(CENTS, rounding=ROUND_HALF_UP)
+        self.grand_total = self.subtotal + self.vat
+
+    @property
+    def grades(self):
+        return [item.grade for item in self.items]
+
+    def update(self, **fields):
+        for name, value in fields.items():
+            if name not in self.OPTIONAL_FIELDS and name != 'status':
+                raise AttributeError(f"Quote field {name!r} cannot be updated")
+            setattr(self, name, value)
+
+    def to_dict(self):
+        data = {
+            'quote_number': self.quote_number,
+            'user_id': self.user_id,
+            'username': self.username,
+            'customer': self.customer,
+            'location': self.location,
+            'items': [[item.grade, str(item.unit_price), str(item.quantity)] for item in self.items],
+            'extras': self.extras,
+            'status': self.status,
+            'created_at': self.created_at,
+        }
+        for name in self.OPTIONAL_FIELDS:
+            value = getattr(self, name)
+            if value is not None:
+                data[name] = value
+        return data
+
+    @classmethod
+    def from_dict(cls, data):
+        """Build a quote from to_dict() output, a stored legacy quote or a conversation draft."""
+        if 'items' in data:
+            items = [LineItem(grade, price, quantity) for grade, price, quantity in data['items']]
+        else:
+            items = [LineItem(g, data['unit_price'][g], data['quantity'][g]) for g in data['grades']]
+        fields = {name: data[name] for name in cls.OPTIONAL_FIELDS if name in data}
+        return cls(
+            data['user_id'], data.get('username'), data['customer'], data['location'], items,
+            data.get('extras', 'None'), data.get('created_at'),
+            quote_number=data.get('quote_number'), status=data.get('status', 'pending'), **fields
+        )
@@ -0,0 +1,83 @@
+import os
+import json
+import hashlib
+import threading
+from collections import OrderedDict
+from expiry import VALIDITY
+
+# Quote fields that appear on the PDF; a change to any of them makes a different document
+PDF_FIELDS = ('quote_number', 'customer', 'location', 'items', 'extras', 'approved_at')
+# Bump when quote_pdf's layout, wording or images change, so cached files and uploaded file ids
+# made with the old template are not sent again
+PDF_TEMPLATE_VERSION = 1
+
+
+def pdf_key(quote):
+    data = quote.to_dict()
+    payload = {f: data.get(f) for f in PDF_FIELDS}
+    payload.update(template=PDF_TEMPLATE_VERSION, validity=VALIDITY)
+    fields = json.dumps(payload, sort_keys=True, separators=(',', ':'))
+    digest = hashlib.sha256(fields.encode('utf-8')).hexdigest()[:16]
+    return f"{quote.quote_number}-{digest}"
+
+
+class PdfCache:
+    """Rendered quote PDFs on local disk, keyed by quote number plus a hash of the quote fields.
+
+    Least recently used files are deleted once the directory grows past max_bytes. File
+    modification times carry the LRU order across restarts.
+    """
+
+    def __init__(self, directory, max_bytes):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        os.makedirs(directory, exist_ok=True)
+        files = []
+        for entry in os.scandir(directory):
+            if entry.is_file() and entry.name.endswith('.pdf'):
+                stat = entry.stat()
+                files.append((stat.st_mtime, entry.name, stat.st_size))
+        self._entries = OrderedDict((name, size) for _, name, size in sorted(files))
+        self._size = sum(self._entries.values())
+        # get/put run on worker threads
+        self._lock = threading.Lock()
+
+    def _path(self, name):
+        return os.path.join(self.directory, name)
+
+    def get(self, quote):
+        with self._lock:
+            return self._get(pdf_key(quote) + '.pdf')
+
+    def _get(self, name):
+        if name not in self._entries:
+            return None
+        try:
+            with open(self._path(name), 'rb') as f:
+                data = f.read()
+            os.utime(self._path(name))
+        except OSError:
+            self._size -= self._entries.pop(name)
+            return None
+        self._entries.move_to_end(name)
+        return data
+
+    def put(self, quote, data):
+        with self._lock:
+            self._put(pdf_key(quote) + '.pdf', data)
+
+    def _put(self, name, data):
+        # Per process, since workers share the directory and may render the same quote at once
+        tmp_path = self._path(f'{name}.{os.getpid()}.tmp')
+        with open(tmp_path, 'wb') as f:
+            f.write(data)
+        os.replace(tmp_path, self._path(name))
+        self._size += len(data) - self._entries.pop(name, 0)
+        self._entries[name] = len(data)
+        while self._size > self.max_bytes and len(self._entries) > 1:
+            old_name, old_size = self._entries.popitem(last=False)
+            self._size -= old_size
+            try:
+                os.remove(self._path(old_name))
+            except OSError:
+                pass
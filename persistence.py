@@ -0,0 +1,124 @@
+import os
+import copy
+import json
+import asyncio
+from telegram.ext import BasePersistence, PersistenceInput
+
+CONVERSATIONS_FILE = 'conversations.json'
+
+
+class ConversationPersistence(BasePersistence):
+    """Keeps ConversationHandler states and user_data (the half-finished pi_data) across restarts.
+
+    PTB hands over the entries that changed every update_interval seconds and once more at
+    shutdown. Those updates are applied in memory and coalesced into a single file write per
+    batch, done off the event loop with an atomic replace.
+    """
+
+    def __init__(self, filepath=CONVERSATIONS_FILE, update_interval=60):
+        super().__init__(
+            store_data=PersistenceInput(bot_data=False, chat_data=False, user_data=True, callback_data=False),
+            update_interval=update_interval
+        )
+        self.filepath = filepath
+        self.user_data = {}
+        self.conversations = {}
+        self._dirty = False
+        self._write_task = None
+        if os.path.exists(filepath):
+            with open(filepath, 'r', encoding='utf-8') as f:
+                data = json.load(f)
+            self.user_data = {int(user_id): value for user_id, value in data.get('user_data', {}).items()}
+            self.conversations = {
+                name: {tuple(json.loads(key)): state for key, state in states.items()}
+                for name, states in data.get('conversations', {}).items()
+            }
+
+    def _mark_dirty(self):
+        self._dirty = True
+        if self._write_task is None or self._write_task.done():
+            # PTB applies a whole batch of updates before this task gets to run
+            self._write_task = asyncio.get_running_loop().create_task(self._write())
+
+    async def _write(self):
+        # Changes made while a write is in progress are picked up by the next pass
+        while self._dirty:
+            self._dirty = False
+            data = {
+                'user_data': {str(user_id): value for user_id, value in self.user_data.items()},
+                'conversations': {
+                    name: {json.dumps(list(key)): state for key, state in states.items()}
+                    for name, states in self.conversations.items()
+                }
+            }
+            await asyncio.to_thread(self._dump, json.dumps(data))
+
+    def _dump(self, payload):
+        tmp_path = self.filepath + '.tmp'
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            f.write(payload)
+        os.replace(tmp_path, self.filepath)
+
+    async def get_user_data(self):
+        # A copy, as PicklePersistence does: the application edits what it gets in place, and
+        # update_user_data() only sees a change when compared against our own version
+        return copy.deepcopy(self.user_data)
+
+    async def update_user_data(self, user_id, data):
+        if self.user_data.get(user_id) == data:
+            return
+        self.user_data[user_id] = data
+        self._mark_dirty()
+
+    async def refresh_user_data(self, user_id, user_data):
+        pass
+
+    async def drop_user_data(self, user_id):
+        if self.user_data.pop(user_id, None) is not None:
+            self._mark_dirty()
+
+    async def get_conversations(self, name):
+        return dict(self.conversations.setdefault(name, {}))
+
+    async def update_conversation(self, name, key, new_state):
+        states = self.conversations.setdefault(name, {})
+        if states.get(key) == new_state:
+            return
+        if new_state is None:
+            states.pop(key, None)
+        else:
+            states[key] = new_state
+        self._mark_dirty()
+
+    async def flush(self):
+        if self._write_task is not None:
+            await self._write_task
+        await self._write()
+
+    # Only user_data and conversations are persisted
+    async def get_chat_data(self):
+        return {}
+
+    async def update_chat_data(self, chat_id, data):
+        pass
+
+    async def refresh_chat_data(self, chat_id, chat_data):
+        pass
+
+    async def drop_chat_data(self, chat_id):
+        pass
+
+    async def get_bot_data(self):
+        return {}
+
+    async def update_bot_data(self, data):
+        pass
+
+    async def refresh_bot_data(self, bot_data):
+        pass
+
+    async def get_callback_data(self):
+        return None
+
+    async def update_callback_data(self, data):
+        pass
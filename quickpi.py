@@ -0,0 +1,73 @@
+import re
+from models import match_extras, parse_amount, parse_extras, parse_grades
+
+QUICKPI_EXAMPLE = "Acme; Bole; C-25 4500x30, C-30 5200x12; Elephant pump"
+
+# Commas separate line items, except thousands separators such as 4,500
+ITEM_SEPARATOR = re.compile(r',(?!\d{3}(?!\d))')
+# GRADE PRICExQUANTITY, e.g. 'C-25 4,500 x 30'
+LINE_ITEM = re.compile(r'(\S+)\s+([\d.,]+)\s*[x×*]\s*([\d.,]+)', re.IGNORECASE)
+
+
+class QuickQuoteError(Exception):
+    def __init__(self, errors):
+        super().__init__('\n'.join(errors))
+        self.errors = errors
+
+
+def parse_quick_quote(text, grades_list, extras_list):
+    """Parse 'customer; location; GRADE PRICExQTY, ...[; extras]' into draft fields.
+
+    Grades and extras are checked with the same rules as the step-by-step /createpi flow.
+    Raises QuickQuoteError listing every problem found.
+    """
+    parts = [part.strip() for part in text.split(';')]
+    if len(parts) not in (3, 4):
+        raise QuickQuoteError([f"Expected 3 or 4 parts separated by ';', got {len(parts)}."])
+    customer, location, items_text = parts[:3]
+    errors = []
+    if not customer:
+        errors.append("customer is empty")
+    if not location:
+        errors.append("location is empty")
+
+    grades, unit_price, quantity = [], {}, {}
+    for item in ITEM_SEPARATOR.split(items_text):
+        item = item.strip()
+        if not item:
+            continue
+        match = LINE_ITEM.fullmatch(item)
+        if not match:
+            errors.append(f"can't read {item!r}; write GRADE PRICExQUANTITY")
+            continue
+        valid, invalid = parse_grades(match.group(1), grades_list)
+        if invalid or len(valid) != 1:
+            errors.append(f"unknown grade {match.group(1)!r}")
+            continue
+        grade = valid[0]
+        if grade in grades:
+            errors.append(f"{grade} is listed twice")
+            continue
+        try:
+            # Strings, like the /createpi draft, so it stays JSON-serializable for persistence
+            unit_price[grade] = str(parse_amount(match.group(2)))
+            quantity[grade] = str(parse_amount(match.group(3)))
+        except ValueError as e:
+            errors.append(f"{grade}: {e}")
+            continue
+        grades.append(grade)
+    if not grades and not errors:
+        errors.append("no grades given")
+
+    extras, unknown = match_extras(parse_extras(parts[3] if len(parts) == 4 else ''), extras_list)
+    errors.extend(f"unknown extra {extra!r}" for extra in unknown)
+    if errors:
+        raise QuickQuoteError(errors)
+    return {
+        'customer': customer,
+        'location': location,
+        'grades': grades,
+        'unit_price': unit_price,
+        'quantity': quantity,
+        'extras': ', '.join(extras) or 'None',
+    }
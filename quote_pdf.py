@@ -0,0 +1,347 @@
+import os
+import copy
+from datetime import datetime
+from PIL import Image
+from reportlab import rl_config
+from reportlab.lib import colors
+from reportlab.lib.pagesizes import A4
+from reportlab.lib.styles import getSampleStyleSheet, ParagraphStyle
+from reportlab.lib.units import inch
+from reportlab.lib.utils import ImageReader, _digester
+from reportlab.pdfbase.pdfdoc import PDFImageXObject, PDFObjectReference, xObjectName
+from reportlab.platypus import SimpleDocTemplate, Table, TableStyle, Paragraph, Spacer, Flowable, HRFlowable
+from reportlab.lib.enums import TA_CENTER, TA_LEFT, TA_RIGHT
+from io import BytesIO
+from expiry import VALIDITY
+
+# Embedded images are downsampled to this resolution at their printed size; 0 embeds the files as they are
+PDF_IMAGE_DPI = int(os.environ.get('PDF_IMAGE_DPI', '150'))
+PDF_IMAGE_QUALITY = int(os.environ.get('PDF_IMAGE_QUALITY', '85'))
+# Downsampled copies, named by source file, its mtime and the target size
+PDF_IMAGE_CACHE = os.environ.get('PDF_IMAGE_CACHE', 'pdf_images')
+
+# Binary image and page streams; ReportLab's default ASCII85 wrapping makes them a quarter larger
+rl_config.useA85 = 0
+
+
+def optimized_image(filename, width, height, dpi=PDF_IMAGE_DPI):
+    """Path of a copy of an image file downsampled to dpi at width x height points, made once per file mtime.
+
+    Opaque images become JPEGs, which ReportLab embeds as they are; images with transparency stay PNG.
+    """
+    if not dpi:
+        return filename
+    size = round(width / inch * dpi), round(height / inch * dpi)
+    stem = os.path.splitext(os.path.basename(filename))[0]
+    prefix = os.path.join(PDF_IMAGE_CACHE, f"{stem}-{os.stat(filename).st_mtime_ns}-{size[0]}x{size[1]}-{PDF_IMAGE_QUALITY}")
+    for path in (f'{prefix}.jpg', f'{prefix}.png'):
+        if os.path.exists(path):
+            return path
+    with Image.open(filename) as image:
+        image.load()
+    if image.mode not in ('RGB', 'RGBA', 'L'):
+        image = image.convert('RGBA')
+    if image.mode == 'RGBA' and image.getchannel('A').getextrema() == (255, 255):
+        image = image.convert('RGB')
+    # Never upsample a source that is already smaller than the target
+    if image.width > size[0] or image.height > size[1]:
+        image = image.resize((min(size[0], image.width), min(size[1], image.height)), Image.LANCZOS)
+    os.makedirs(PDF_IMAGE_CACHE, exist_ok=True)
+    path = f'{prefix}.png' if image.mode == 'RGBA' else f'{prefix}.jpg'
+    # Several render workers may make the same file at once; each writes its own and renames it into place
+    tmp_path = f'{path}.{os.getpid()}.tmp'
+    if path.endswith('.png'):
+        image.save(tmp_path, 'PNG', optimize=True)
+    else:
+        image.save(tmp_path, 'JPEG', quality=PDF_IMAGE_QUALITY, optimize=True)
+    os.replace(tmp_path, path)
+    print(f"Optimized {filename} for PDFs: {os.path.getsize(filename) // 1024} KB -> {os.path.getsize(path) // 1024} KB")
+    return path
+
+
+class PrebuiltImage(Flowable):
+    """Image flowable whose PDF image object is decoded and encoded once and shared by every document.
+
+    platypus.Image re-reads, re-compresses and re-encodes the file on every build, which is most
+    of the cost of a quote PDF.
+    """
+
+    def __init__(self, filename, width, height):
+        Flowable.__init__(self)
+        self.drawWidth = width
+        self.drawHeight = height
+        # Same naming scheme canvas.drawImage uses for files, so drawImage finds the registered object
+        self._name = _digester(f'{filename}auto')
+        self._key = filename
+        # A file name lets ReportLab embed a JPEG's data directly instead of decoding and recompressing it
+        source = filename if filename.lower().endswith(('.jpg', '.jpeg')) else ImageReader(filename)
+        self._xobject = PDFImageXObject(self._name, source, mask='auto')
+        self._smask = self._xobject.__dict__.pop('_smask', None)
+        if self._smask is not None:
+            self._xobject.smask = PDFObjectReference(xObjectName(self._smask.name))
+
+    def __deepcopy__(self, memo):
+        # The encoded image is immutable; copies only need their own layout state
+        return copy.copy(self)
+
+    def wrap(self, availWidth, availHeight):
+        return self.drawWidth, self.drawHeight
+
+    def draw(self):
+        doc = self.canv._doc
+        reg_name = xObjectName(self._name)
+        if reg_name not in doc.idToObject:
+            # Documents tag the objects they register, so each one gets its own shallow copy;
+            # the encoded image data itself is shared.
+            xobject = copy.copy(self._xobject)
+            doc.Reference(xobject, reg_name)
+            doc.addForm(self._name, xobject)
+            if self._smask is not None:
+                doc.Reference(copy.copy(self._smask), xObjectName(self._smask.name))
+        self.canv.drawImage(self._key, 0, 0, self.drawWidth, self.drawHeight, mask='auto')
+
+
+class QuoteTemplate:
+    """Everything in a quote PDF that does not depend on the quote: styles, table styles, images
+    and the static header/footer flowables. Build it once; render() only builds the customer
+    and pricing tables.
+
+    Flowables keep layout state while a document is built, so the static header and footer are
+    kept as parsed prototypes and each render lays out its own copy of them.
+    """
+
+    def __init__(self, logo_file='logo.png', signature_file='signature.png', image_dpi=PDF_IMAGE_DPI):
+        styles = getSampleStyleSheet()
+        self.normal_style = styles['Normal']
+        title_style = ParagraphStyle('CustomTitle', parent=styles['Heading1'], fontSize=18, textColor=colors.HexColor('#1a3a6b'), spaceAfter=8, alignment=TA_CENTER, fontName='Helvetica-Bold')
+        header_style = ParagraphStyle('Header', parent=styles['Normal'], fontSize=7, textColor=colors.HexColor('#666666'), alignment=TA_LEFT)
+        note_style = ParagraphStyle('Note', parent=styles['Normal'], fontSize=6, textColor=colors.HexColor('#666666'))
+        terms_style = ParagraphStyle('Terms', parent=styles['Normal'], fontSize=7)
+        contact_style = ParagraphStyle('Contact', parent=styles['Normal'], fontSize=7)
+        approved_by_style = ParagraphStyle('ApprovedBy', parent=styles['Normal'], fontSize=8, alignment=TA_RIGHT)
+        footer_style = ParagraphStyle('Footer', parent=styles['Normal'], fontSize=7)
+
+        self.customer_table_style = TableStyle([
+            ('FONTNAME', (0, 0), (-1, -1), 'Helvetica'),
+            ('FONTSIZE', (0, 0), (-1, -1), 7),
+            ('FONTNAME', (0, 0), (0, -1), 'Helvetica-Bold'),
+            ('FONTNAME', (2, 0), (2, -1), 'Helvetica-Bold'),
+            ('TEXTCOLOR', (0, 0), (-1, -1), colors.HexColor('#333333')),
+            ('ALIGN', (0, 0), (-1, -1), 'LEFT'),
+            ('VALIGN', (0, 0), (-1, -1), 'TOP'),
+            ('BOTTOMPADDING', (0, 0), (-1, -1), 4),
+            ('LINEBELOW', (0, 0), (-1, -1), 0.5, colors.HexColor('#dddddd')),
+        ])
+        self.pricing_table_style = TableStyle([
+            ('BACKGROUND', (0, 0), (-1, 0), colors.HexColor('#d2691e')),
+            ('TEXTCOLOR', (0, 0), (-1, 0), colors.whitesmoke),
+            ('ALIGN', (0, 0), (-1, 0), 'CENTER'),
+            ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
+            ('FONTSIZE', (0, 0), (-1, 0), 8),
+            ('BOTTOMPADDING', (0, 0), (-1, 0), 8),
+            ('TOPPADDING', (0, 0), (-1, 0), 8),
+            ('BACKGROUND', (0, 1), (-1, -4), colors.beige),
+            ('TEXTCOLOR', (0, 1), (-1, -1), colors.HexColor('#333333')),
+            ('ALIGN', (0, 1), (-1, -4), 'CENTER'),
+            ('FONTNAME', (0, 1), (-1, -4), 'Helvetica'),
+            ('FONTSIZE', (0, 1), (-1, -4), 7),
+            ('GRID', (0, 0), (-1, -4), 0.5, colors.HexColor('#999999')),
+            ('VALIGN', (0, 0), (-1, -1), 'MIDDLE'),
+            ('ROWBACKGROUNDS', (0, 1), (-1, -4), [colors.beige, colors.white]),
+            # Subtotal row styling
+            ('SPAN', (0, -3), (3, -3)),
+            ('ALIGN', (4, -3), (-1, -3), 'RIGHT'),
+            ('FONTNAME', (4, -3), (-1, -3), 'Helvetica-Bold'),
+            ('FONTSIZE', (4, -3), (-1, -3), 8),
+            ('LINEABOVE', (0, -3), (-1, -3), 1, colors.HexColor('#999999')),
+            # VAT row styling
+            ('SPAN', (0, -2), (3, -2)),
+            ('ALIGN', (4, -2), (-1, -2), 'RIGHT'),
+            ('FONTNAME', (4, -2), (-1, -2), 'Helvetica'),
+            ('FONTSIZE', (4, -2), (-1, -2), 7),
+            # Grand Total row styling
+            ('SPAN', (0, -1), (3, -1)),
+            ('ALIGN', (4, -1), (-1, -1), 'RIGHT'),
+            ('FONTNAME', (4, -1), (-1, -1), 'Helvetica-Bold'),
+            ('FONTSIZE', (4, -1), (-1, -1), 9),
+            ('LINEABOVE', (0, -1), (-1, -1), 1.5, colors.HexColor('#d2691e')),
+            ('BACKGROUND', (4, -1), (-1, -1), colors.HexColor('#f5f5dc')),
+        ])
+
+        # Header with company info and logo
+        company_info = """
+        <b>CoBuilt Solutions</b><br/>
+        Addis Ababa, Ethiopia<br/>
+        Phone: +251911246502<br/>
+        +251911246820<br/>
+        Email: CoBuilt@CoBuilt.com<br/>
+        Web: www.CoBuilt.com
+        """
+        self.header = []
+        # Try to add logo in top right corner
+        try:
+            logo = PrebuiltImage(optimized_image(logo_file, 1*inch, 1*inch, image_dpi), width=1*inch, height=1*inch)
+            logo.hAlign = 'RIGHT'
+
+            # Create table to position company info and logo side by side
+            header_table = Table([[Paragraph(company_info, header_style), logo]], colWidths=[4*inch, 3*inch])
+            header_table.setStyle(TableStyle([
+                ('VALIGN', (0, 0), (-1, -1), 'TOP'),
+                ('ALIGN', (0, 0), (0, 0), 'LEFT'),
+                ('ALIGN', (1, 0), (1, 0), 'RIGHT'),
+            ]))
+            self.header.append(header_table)
+        except Exception:
+            # If logo not found, just add company info
+            self.header.append(Paragraph(company_info, header_style))
+
+        self.header.append(Spacer(1, 6))
+        # Add horizontal line after header
+        self.header.append(HRFlowable(width="100%", thickness=1.5, color=colors.HexColor('#1a3a6b'), spaceAfter=6))
+        self.header.append(Paragraph("CONCRETE QUOTE", title_style))
+        # Add horizontal line after title
+        self.header.append(HRFlowable(width="100%", thickness=0.5, color=colors.HexColor('#cccccc'), spaceBefore=2, spaceAfter=6))
+
+        self.footer = [Spacer(1, 6)]
+        # Add horizontal line before notes
+        self.footer.append(HRFlowable(width="100%", thickness=0.5, color=colors.HexColor('#cccccc'), spaceAfter=4))
+        vat_notice = "<para align=left textColor=#666666><i>Note: VAT (15%) has been included in the Grand Total above.</i></para>"
+        self.footer.append(Paragraph(vat_notice, note_style))
+        discount_notice = "<para align=left textColor=#999999>- As the order volume increases, we can extend a discount accordingly.</para>"
+        self.footer.append(Paragraph(discount_notice, note_style))
+        self.footer.append(Spacer(1, 5))
+
+        # Add horizontal line before terms
+        self.footer.append(HRFlowable(width="100%", thickness=0.5, color=colors.HexColor('#cccccc'), spaceAfter=4))
+        terms_title = "<para align=left><b>Terms &amp; Conditions</b></para>"
+        self.footer.append(Paragraph(terms_title, terms_style))
+        self.footer.append(Spacer(1, 3))
+        terms = f"""
+        • Delivery Schedule: Within 7–10 working days from confirmation.<br/>
+        • Payment Terms: 100% advance.<br/>
+        • Validity: This quote is valid for {VALIDITY} from the date of issue.<br/>
+        • Exclusions: Does not include site preparation, road access issues, or waiting time beyond 1 hour per truck.
+        """
+        self.footer.append(Paragraph(terms, terms_style))
+        self.footer.append(Spacer(1, 5))
+
+        # Add horizontal line before contact info
+        self.footer.append(HRFlowable(width="100%", thickness=0.5, color=colors.HexColor('#cccccc'), spaceAfter=4))
+        footer_contact = """
+        <para align=left><b>For any clarifications, please contact:</b><br/>
+        Biruk Endale<br/>
+        Chief Operation Officer<br/>
+        CoBuilt Solutions<br/>
+        +251911246502<br/>
+        +251911246520
+        </para>
+        """
+        self.footer.append(Paragraph(footer_contact, contact_style))
+        self.footer.append(Spacer(1, 3))
+
+        try:
+            # Signature with "Approved By:" text - maintaining aspect ratio from uploaded image
+            signature = PrebuiltImage(optimized_image(signature_file, 3*inch, 1.75*inch, image_dpi), width=3*inch, height=1.75*inch)
+            approved_by_text = Paragraph("<b>Approved By:</b>", approved_by_style)
+
+            # Create table with signature and text below it
+            sig_table = Table([[signature], [approved_by_text]], colWidths=[3*inch])
+            sig_table.setStyle(TableStyle([
+                ('VALIGN', (0, 0), (-1, -1), 'MIDDLE'),
+                ('ALIGN', (0, 0), (0, 0), 'RIGHT'),
+                ('ALIGN', (0, 1), (0, 1), 'RIGHT'),
+                ('LEFTPADDING', (0, 0), (-1, -1), 0),
+                ('RIGHTPADDING', (0, 0), (-1, -1), 0),
+                ('BOTTOMPADDING', (0, 0), (-1, -1), 0),
+                ('TOPPADDING', (0, 0), (0, 0), 0),
+                ('TOPPADDING', (0, 1), (0, 1), 2),
+            ]))
+            sig_table.hAlign = 'RIGHT'
+            self.footer.append(sig_table)
+        except Exception as e:
+            print(f"Could not add signature: {e}")
+
+        self.footer.append(Spacer(1, 3))
+        # Add final horizontal line before company footer
+        self.footer.append(HRFlowable(width="100%", thickness=1.5, color=colors.HexColor('#1a3a6b'), spaceAfter=3))
+        company_footer = "<para align=left><b>A branch of SSara Group</b></para>"
+        self.footer.append(Paragraph(company_footer, footer_style))
+
+    def render(self, quote):
+        buffer = BytesIO()
+        pdf = SimpleDocTemplate(buffer, pagesize=A4, rightMargin=40, leftMargin=40, topMargin=25, bottomMargin=25, pageCompression=1)
+        elements = copy.deepcopy(self.header)
+
+        # Date the quote by its approval so a re-render produces the same document
+        issued = datetime.fromisoformat(quote.approved_at) if quote.approved_at else datetime.now()
+        date_quote = f"<para align=right><b>Date:</b> {issued.strftime('%b %d, %Y')}<br/><b>Quote No:</b> {quote.quote_number}</para>"
+        elements.append(Paragraph(date_quote, self.normal_style))
+        elements.append(Spacer(1, 6))
+
+        customer_data = [
+            ['Company:', quote.customer, 'Additional service:', quote.extras],
+            ['Location:', quote.location, 'Payment terms:', '100% advance'],
+            ['Quantity:', f"{quote.total_quantity:,.2f}m³", 'Validity of quote:', f'Valid for {VALIDITY}'],
+            ['Concrete Grade:', ', '.join(quote.grades), '', '']
+        ]
+        customer_table = Table(customer_data, colWidths=[1.3*inch, 2*inch, 1.6*inch, 2*inch])
+        customer_table.setStyle(self.customer_table_style)
+        elements.append(customer_table)
+        elements.append(Spacer(1, 8))
+
+        table_data = [['No.', 'Description', 'Grade', 'Quantity', 'Price', 'Total Price']]
+        for idx, item in enumerate(quote.items, 1):
+            table_data.append([str(idx), 'Concrete OPC', item.grade, f"{item.quantity:,.2f}m³", f"{item.unit_price:,.2f}", f"{item.total:,.2f}"])
+        table_data.append(['', '', '', '', 'Subtotal:', f"{quote.subtotal:,.2f}"])
+        table_data.append(['', '', '', '', 'VAT (15%):', f"{quote.vat:,.2f}"])
+        table_data.append(['', '', '', '', 'Grand Total:', f"{quote.grand_total:,.2f}"])
+
+        pricing_table = Table(table_data, colWidths=[0.4*inch, 2.3*inch, 0.7*inch, 0.9*inch, 1.1*inch, 1.4*inch])
+        pricing_table.setStyle(self.pricing_table_style)
+        elements.append(pricing_table)
+
+        elements.extend(copy.deepcopy(self.footer))
+        pdf.build(elements)
+        buffer.seek(0)
+        return buffer
+
+
+_template = None
+
+
+def get_template():
+    """The shared QuoteTemplate, built on first use (once per worker process)."""
+    global _template
+    if _template is None:
+        _template = QuoteTemplate()
+    return _template
+
+
+def generate_pdf(quote):
+    return get_template().render(quote)
+
+
+def generate_pdf_bytes(quote):
+    return generate_pdf(quote).getvalue()
+
+
+if __name__ == '__main__':
+    # Per-PDF latency: python quote_pdf.py [renders]
+    import sys
+    import time
+    from models import Quote
+    sample = Quote.from_dict({
+        'quote_number': 'RMX-0101', 'user_id': 0, 'customer': 'Sample Customer', 'location': 'Bole', 'extras': 'Elephant pump',
+        'items': [['C-25', '4500', '30'], ['C-30', '5200', '12']],
+    })
+    renders = int(sys.argv[1]) if len(sys.argv) > 1 else 20
+    start = time.perf_counter()
+    get_template()
+    print(f"Template build: {(time.perf_counter() - start) * 1000:.1f} ms")
+    start = time.perf_counter()
+    for _ in range(renders):
+        generate_pdf_bytes(sample)
+    print(f"Render: {(time.perf_counter() - start) * 1000 / renders:.1f} ms per PDF over {renders} PDFs")
+    size = len(generate_pdf_bytes(sample))
+    original = len(QuoteTemplate(image_dpi=0).render(sample).getvalue())
+    print(f"PDF size: {size / 1024:.1f} KB at {PDF_IMAGE_DPI} dpi, {original / 1024:.1f} KB with the original images")
@@ -0,0 +1,93 @@
+import os
+import time
+import asyncio
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from metrics import metrics
+from pdf_cache import PdfCache
+
+# PDF rendering: 'process' (separate worker processes) or 'thread'
+PDF_EXECUTOR = os.environ.get('PDF_EXECUTOR', 'process')
+PDF_WORKERS = int(os.environ.get('PDF_WORKERS', '2'))
+# Start the render workers and build their template right after startup instead of on the first approval
+PDF_WARMUP = os.environ.get('PDF_WARMUP', '1') == '1'
+
+# Approved PDFs are kept on disk so they can be downloaded again without re-rendering
+PDF_CACHE_DIR = os.environ.get('PDF_CACHE_DIR', 'pdf_cache')
+PDF_CACHE_MAX_MB = int(os.environ.get('PDF_CACHE_MAX_MB', '200'))
+
+_executor = None
+_cache = None
+# Limits renders handed to the executor at once; further callers wait here without blocking the loop
+_render_slots = asyncio.Semaphore(PDF_WORKERS)
+# Renders running or waiting for a slot
+_pending_renders = 0
+metrics.gauge('pdf_queue_depth', lambda: _pending_renders)
+
+
+def _prepare_worker():
+    # quote_pdf pulls in ReportLab, which takes a while to import; only render workers need it
+    from quote_pdf import get_template
+    get_template()
+
+
+def _render(quote):
+    from quote_pdf import generate_pdf_bytes
+    return generate_pdf_bytes(quote)
+
+
+def _get_executor():
+    global _executor
+    if _executor is None:
+        if PDF_EXECUTOR == 'thread':
+            _executor = ThreadPoolExecutor(max_workers=PDF_WORKERS, thread_name_prefix='pdf', initializer=_prepare_worker)
+        else:
+            # Each worker process builds its quote template once, before its first render
+            _executor = ProcessPoolExecutor(max_workers=PDF_WORKERS, initializer=_prepare_worker)
+    return _executor
+
+
+async def render_pdf(quote):
+    """Render a quote PDF off the event loop and return its bytes."""
+    global _pending_renders
+    _pending_renders += 1
+    queued = time.perf_counter()
+    try:
+        async with _render_slots:
+            metrics.observe('pdf_queue_wait_seconds', time.perf_counter() - queued)
+            loop = asyncio.get_running_loop()
+            with metrics.timer('pdf_render_seconds'):
+                return await loop.run_in_executor(_get_executor(), _render, quote)
+    finally:
+        _pending_renders -= 1
+
+
+async def warm_renderer():
+    """Start the render workers off the event loop so the first approval doesn't wait for them."""
+    started = time.perf_counter()
+    await asyncio.get_running_loop().run_in_executor(_get_executor(), _prepare_worker)
+    print(f"PDF renderer ready in {(time.perf_counter() - started) * 1000:.0f} ms")
+
+
+def _get_cache():
+    global _cache
+    if _cache is None:
+        _cache = PdfCache(PDF_CACHE_DIR, PDF_CACHE_MAX_MB * 1024 * 1024)
+    return _cache
+
+
+async def quote_pdf_bytes(quote):
+    """PDF bytes for an approved quote, served from the disk cache and rendered only on a miss."""
+    cache = _get_cache()
+    data = await asyncio.to_thread(cache.get, quote)
+    metrics.inc('pdf_cache_requests_total', result='miss' if data is None else 'hit')
+    if data is None:
+        data = await render_pdf(quote)
+        await asyncio.to_thread(cache.put, quote, data)
+    return data
+
+
+def shutdown_renderer():
+    global _executor
+    if _executor is not None:
+        _executor.shutdown(wait=True)
+        _executor = None
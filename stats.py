@@ -0,0 +1,98 @@
+from datetime import datetime
+from decimal import Decimal, ROUND_HALF_UP
+from models import CENTS, VAT_RATE
+
+# Every cell holds these running sums as integers, so SQLite can add to them exactly in place
+STAT_FIELDS = ('count', 'litres', 'subtotal_cents', 'total_cents', 'approval_seconds')
+
+
+def _cents(amount):
+    return int((amount / CENTS).to_integral_value(rounding=ROUND_HALF_UP))
+
+
+def _litres(cubic_metres):
+    return int((cubic_metres * 1000).to_integral_value(rounding=ROUND_HALF_UP))
+
+
+def _approval_seconds(quote):
+    if quote.status != 'approved' or not quote.approved_at or not quote.created_at:
+        return 0
+    waited = datetime.fromisoformat(quote.approved_at) - datetime.fromisoformat(quote.created_at)
+    return max(0, int(waited.total_seconds()))
+
+
+def contributions(quote):
+    """(dimension, key, status) cells a quote adds to, with its STAT_FIELDS values for each.
+
+    Dimensions are 'all', 'day' (created date) and 'grade'; a grade cell counts only that line item.
+    """
+    waited = _approval_seconds(quote)
+    values = (1, _litres(quote.total_quantity), _cents(quote.subtotal), _cents(quote.grand_total), waited)
+    yield ('all', '', quote.status), values
+    yield ('day', (quote.created_at or '')[:10], quote.status), values
+    for item in quote.items:
+        yield ('grade', item.grade, quote.status), (
+            1, _litres(item.quantity), _cents(item.total), _cents(item.total * (1 + VAT_RATE)), waited
+        )
+
+
+class QuoteStats:
+    """Running totals of quotes by status, day and grade.
+
+    Kept up to date by adding a quote's contributions when it is created and swapping the old
+    for the new ones when it changes, so reading them never touches the quotes themselves.
+    """
+
+    def __init__(self, cells=None):
+        self.cells = cells or {}
+
+    def add(self, quote, sign=1):
+        for cell, values in contributions(quote):
+            sums = self.cells.setdefault(cell, [0] * len(STAT_FIELDS))
+            for i, value in enumerate(values):
+                sums[i] += sign * value
+            if not any(sums):
+                del self.cells[cell]
+
+    def remove(self, quote):
+        self.add(quote, -1)
+
+    def get(self, dimension, key=''):
+        """{status: {field: value}} for one cell key, e.g. get('grade', 'C-25')."""
+        return {
+            status: dict(zip(STAT_FIELDS, sums))
+            for (d, k, status), sums in self.cells.items() if d == dimension and k == key
+        }
+
+    def keys(self, dimension):
+        return sorted({k for d, k, _ in self.cells if d == dimension})
+
+    def differences(self, other):
+        """Number of cells whose sums differ between two QuoteStats."""
+        return sum(1 for cell in self.cells.keys() | other.cells.keys() if self.cells.get(cell) != other.cells.get(cell))
+
+    def copy(self):
+        return QuoteStats({cell: list(sums) for cell, sums in self.cells.items()})
+
+    def to_list(self):
+        return [[*cell, *sums] for cell, sums in self.cells.items()]
+
+    @classmethod
+    def from_list(cls, rows):
+        # SQLite keeps cells that went back to zero; leave them out like add() does
+        return cls({tuple(row[:3]): list(row[3:]) for row in rows if any(row[3:])})
+
+    @classmethod
+    def from_quotes(cls, quotes):
+        stats = cls()
+        for quote in quotes:
+            stats.add(quote)
+        return stats
+
+
+def litres_to_m3(litres):
+    return Decimal(litres) / 1000
+
+
+def cents_to_birr(cents):
+    return Decimal(cents) * CENTS
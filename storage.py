@@ -0,0 +1,889 @@
+import os
+import json
+import time
+import asyncio
+import sqlite3
+import threading
+try:
+    import fcntl
+except ImportError:
+    # Not available on Windows; the single-process guard is skipped there
+    fcntl = None
+from datetime import datetime, timedelta
+from itertools import chain, islice
+from archive import ARCHIVE_DIR, QuoteArchive
+from metrics import metrics
+from models import OPEN_STATUSES, Quote
+from stats import STAT_FIELDS, QuoteStats, contributions
+
+# Data persistence
+DATA_FILE = 'bot_data.json'
+JOURNAL_FILE = 'bot_data.journal'
+DB_FILE = 'bot_data.sqlite3'
+LOCK_FILE = 'bot_data.lock'
+
+# Number of journal records after which the snapshot is rewritten and the journal truncated
+COMPACT_EVERY = 1000
+
+# Seconds between background fsyncs of the journal; store.flush() forces one sooner
+SYNC_INTERVAL = float(os.environ.get('SYNC_INTERVAL', '1'))
+
+# Closed quotes older than this many days move to the monthly archive; 0 keeps everything in memory
+ARCHIVE_AFTER_DAYS = int(os.environ.get('ARCHIVE_AFTER_DAYS', '180'))
+CLOSED_STATUSES = ('approved', 'rejected', 'expired')
+
+# Quote numbers a SQLite store reserves at a time. Several workers then rarely contend for the
+# counter; numbers left in a block when a worker stops are skipped.
+QUOTE_BLOCK_SIZE = int(os.environ.get('QUOTE_BLOCK_SIZE', '1'))
+# Times a SQLite update is retried when another worker changed the quote in between
+UPDATE_ATTEMPTS = 5
+# Seconds a SQLite write on the event loop waits for another worker's write to finish. Writes
+# only hold the lock for milliseconds; much longer would stall every handler of this worker.
+SQLITE_BUSY_TIMEOUT = float(os.environ.get('SQLITE_BUSY_TIMEOUT', '1'))
+
+
+def format_quote_number(counter):
+    return f"RMX-{counter:04d}"
+
+
+def quote_counter(quote_number):
+    return int(quote_number.split('-', 1)[1])
+
+
+def quote_numbers_between(first, last):
+    """Quote numbers from first to last inclusive, e.g. a batch created by create_quotes()."""
+    start, end = (quote_counter(qn) for qn in (first, last))
+    return [format_quote_number(counter) for counter in range(start, end + 1)]
+
+
+def empty_data():
+    return {'quote_counter': 100, 'quotes': {}, 'stats': QuoteStats()}
+
+
+def apply_record(data, record):
+    """Apply one journal record to the in-memory data. Replaying a record twice is harmless."""
+    stats = data['stats']
+    if record['op'] == 'create':
+        quote = Quote.from_dict(record['quote'])
+        replaced = data['quotes'].get(quote.quote_number)
+        if replaced is not None:
+            stats.remove(replaced)
+        data['quotes'][quote.quote_number] = quote
+        stats.add(quote)
+        data['quote_counter'] = max(data['quote_counter'], record['counter'])
+    elif record['op'] == 'update':
+        quote = data['quotes'].get(record['quote_number'])
+        if quote is not None:
+            stats.remove(quote)
+            quote.update(**record['fields'])
+            stats.add(quote)
+
+
+class JournalStore:
+    """Quote store backed by a JSON snapshot plus an append-only journal.
+
+    Every new quote or status change is appended to the journal as a single JSON line, so the
+    cost of a write does not depend on how many quotes exist. The snapshot is only rewritten
+    every COMPACT_EVERY records, and load replays the journal on top of it.
+
+    Only recent and open quotes are kept in memory. On startup and at every compaction, closed
+    quotes older than archive_after_days move to a QuoteArchive, which is read only when a
+    lookup goes past the in-memory quotes.
+
+    Running statistics (see QuoteStats) are updated as records are applied and saved in the
+    snapshot, so they still cover archived quotes.
+
+    The snapshot is JSON lines: a header with the counter and statistics, then the pending
+    quotes, then the rest. Opening the store reads only the header and the pending quotes; the
+    rest is parsed by load_remaining() in a thread after startup, or at once by the first call
+    that needs it. Journal records for quotes not loaded yet wait until then.
+
+    Appends reach the OS at once but are fsynced by run_writer(), a background task that
+    coalesces every append of a sync interval into one fsync off the event loop. While it runs,
+    compaction happens there too: the journal is rotated to <journal>.1 and the snapshot written
+    in a thread. Callers that must not lose a change await flush().
+    """
+
+    def __init__(self, data_file=DATA_FILE, journal_file=JOURNAL_FILE, compact_every=COMPACT_EVERY,
+                 archive_dir=ARCHIVE_DIR, archive_after_days=ARCHIVE_AFTER_DAYS):
+        self.data_file = data_file
+        self.journal_file = journal_file
+        self.compact_every = compact_every
+        self.rotated_journal_file = journal_file + '.1'
+        # Records appended and records known to be on disk, counted since open
+        self._appended = 0
+        self._synced = 0
+        self._compact_due = False
+        self._writer_running = False
+        self._closing = False
+        self._wake = None
+        self._flush_lock = None
+        self._lock = self._acquire_lock(os.path.join(os.path.dirname(data_file), LOCK_FILE))
+        self.archive = QuoteArchive(archive_dir)
+        self.archive_after_days = archive_after_days
+        # Snapshot quotes not parsed yet: the open snapshot file and where they start in it
+        self._rest_file = None
+        self._rest_offset = None
+        self._rest_quotes = None
+        self._rest_lock = threading.Lock()
+        # Journal records that touch quotes not loaded yet, applied once they are
+        self._deferred = []
+        self._deferred_numbers = set()
+        started = time.perf_counter()
+        self.data = self._load()
+        self._index_users()
+        print(f"Loaded {len(self.data['quotes'])} quotes in {(time.perf_counter() - started) * 1000:.0f} ms"
+              + (", the rest load in the background" if self._rest_offset is not None else ""))
+        self._journal = open(self.journal_file, 'a', encoding='utf-8')
+        if self._stats_missing:
+            # Snapshot from before statistics were kept
+            self.rebuild_stats()
+        elif os.path.exists(self.rotated_journal_file):
+            # The last background compaction did not finish
+            self.compact()
+        elif self._rest_offset is None and self._archive_closed_quotes():
+            self.compact()
+
+    @staticmethod
+    def _acquire_lock(path):
+        """The journal is only safe with one writer; refuse to open it from a second process."""
+        lock = open(path, 'a')
+        if fcntl is not None:
+            try:
+                fcntl.flock(lock, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except BlockingIOError:
+                lock.close()
+                raise RuntimeError(
+                    "The quote journal is in use by another process; use QUOTE_STORE=sqlite to run several workers"
+                )
+        return lock
+
+    def _index_users(self):
+        # Quote numbers per user in creation order, kept up to date on every create
+        self._by_user = {}
+        for quote in self.data['quotes'].values():
+            self._by_user.setdefault(quote.user_id, []).append(quote.quote_number)
+
+    def _quotes_to_archive(self):
+        if not self.archive_after_days:
+            return []
+        cutoff = (datetime.now() - timedelta(days=self.archive_after_days)).isoformat()
+        return [
+            quote for quote in self.data['quotes'].values()
+            if quote.status in CLOSED_STATUSES and quote.created_at and quote.created_at < cutoff
+        ]
+
+    def _drop_archived(self, quotes):
+        for quote in quotes:
+            del self.data['quotes'][quote.quote_number]
+        self._index_users()
+        print(f"Archived {len(quotes)} quotes older than {self.archive_after_days} days")
+
+    def _archive_closed_quotes(self):
+        """Move old closed quotes to the archive; returns how many moved. The caller compacts."""
+        old = self._quotes_to_archive()
+        if not old:
+            return 0
+        # Written and synced before the snapshot drops them; a crash in between only means
+        # they are archived again, which replaces the earlier copy
+        self.archive.add(old)
+        self._drop_archived(old)
+        return len(old)
+
+    async def _archive_closed_quotes_in_thread(self):
+        """_archive_closed_quotes() with the segment rewrites and fsyncs off the event loop."""
+        old = self._quotes_to_archive()
+        if not old:
+            return
+        # Copies: the quotes can still change on the loop while the thread writes them
+        copies = [Quote.from_dict(quote.to_dict()) for quote in old]
+        self.archive.use_index(await asyncio.to_thread(self.archive.write, copies))
+        changed = [quote for quote, copy in zip(old, copies) if quote.to_dict() != copy.to_dict()]
+        if changed:
+            # Rare, e.g. an approved quote expiring meanwhile; its archived copy is replaced
+            self.archive.add(changed)
+        self._drop_archived(old)
+
+    @property
+    def quotes(self):
+        self._ensure_loaded()
+        return self.data['quotes']
+
+    def _load(self):
+        data = empty_data()
+        self._stats_missing = False
+        if os.path.exists(self.data_file):
+            f = open(self.data_file, 'rb')
+            try:
+                header = json.loads(f.readline())
+            except ValueError:
+                header = None
+            if header is None or 'format' not in header:
+                # Single JSON document from before the line format; rewritten at the next compaction
+                f.seek(0)
+                legacy = json.load(f)
+                f.close()
+                data['quote_counter'] = legacy['quote_counter']
+                data['quotes'] = {qn: Quote.from_dict(quote) for qn, quote in legacy['quotes'].items()}
+                self._stats_missing = 'stats' not in legacy
+                data['stats'] = QuoteStats.from_list(legacy.get('stats', []))
+            else:
+                data['quote_counter'] = header['quote_counter']
+                data['stats'] = QuoteStats.from_list(header['stats'])
+                for _ in range(header['pending']):
+                    quote = Quote.from_dict(json.loads(f.readline()))
+                    data['quotes'][quote.quote_number] = quote
+                if header['quotes'] > header['pending']:
+                    # Kept open: a compaction may replace the file before the rest is read
+                    self._rest_file, self._rest_offset = f, f.tell()
+                else:
+                    f.close()
+        self._snapshot_counter = data['quote_counter']
+        self._records = 0
+        # The rotated journal, if any, holds the records from before the current one
+        for journal_file in (self.rotated_journal_file, self.journal_file):
+            if os.path.exists(journal_file):
+                self._records += self._replay(data, journal_file, self._apply_loaded)
+        return data
+
+    def _apply_loaded(self, data, record):
+        """Apply a replayed record now, or hold it back if its quote may be in the unread snapshot part."""
+        if self._rest_offset is not None:
+            if record['op'] == 'create':
+                quote_number, old = record['quote']['quote_number'], record['counter'] <= self._snapshot_counter
+            else:
+                quote_number, old = record['quote_number'], True
+            if quote_number in self._deferred_numbers or (old and quote_number not in data['quotes']):
+                self._deferred.append(record)
+                self._deferred_numbers.add(quote_number)
+                return
+        apply_record(data, record)
+
+    def _read_rest(self):
+        """Parse the snapshot quotes not loaded at startup; safe to call from a worker thread."""
+        with self._rest_lock:
+            if self._rest_offset is None:
+                # Already loaded and merged by someone else
+                return []
+            if self._rest_quotes is None:
+                with self._rest_file as f:
+                    f.seek(self._rest_offset)
+                    self._rest_quotes = [Quote.from_dict(json.loads(line)) for line in f]
+            return self._rest_quotes
+
+    def _merge_rest(self, quotes):
+        if self._rest_offset is None:
+            return
+        self._rest_file = self._rest_offset = self._rest_quotes = None
+        merged = {quote.quote_number: quote for quote in quotes}
+        merged.update(self.data['quotes'])
+        # Back into creation order, which paging and the pending list rely on
+        self.data['quotes'] = dict(sorted(merged.items(), key=lambda item: quote_counter(item[0])))
+        for record in self._deferred:
+            apply_record(self.data, record)
+        self._deferred, self._deferred_numbers = [], set()
+        self._index_users()
+        if self._quotes_to_archive():
+            # Compaction archives them, off the event loop when the writer task runs
+            self._request_compaction()
+
+    def _ensure_loaded(self):
+        if self._rest_offset is not None:
+            self._merge_rest(self._read_rest())
+
+    async def load_remaining(self):
+        """Load the quotes left out at startup without blocking the event loop."""
+        if self._rest_offset is None:
+            return
+        started = time.perf_counter()
+        quotes = await asyncio.to_thread(self._read_rest)
+        self._merge_rest(quotes)
+        print(f"Loaded the remaining {len(quotes)} quotes in {(time.perf_counter() - started) * 1000:.0f} ms")
+
+    @staticmethod
+    def _replay(data, journal_file, apply=apply_record):
+        records = 0
+        with open(journal_file, 'rb+') as f:
+            good_offset = 0
+            for line in f:
+                try:
+                    if not line.endswith(b'\n'):
+                        raise ValueError('incomplete record')
+                    record = json.loads(line)
+                except ValueError:
+                    # A crash mid-append leaves a torn last line; drop it so new records
+                    # are not glued onto it. Everything before it is intact.
+                    print(f"Dropping torn journal record in {journal_file}")
+                    f.truncate(good_offset)
+                    break
+                apply(data, record)
+                good_offset += len(line)
+                records += 1
+        return records
+
+    def _append(self, *records):
+        for record in records:
+            apply_record(self.data, record)
+        with metrics.timer('store_write_seconds', backend='journal'):
+            self._journal.write(''.join(json.dumps(record, separators=(',', ':')) + '\n' for record in records))
+            self._journal.flush()
+        self._records += len(records)
+        self._appended += len(records)
+        if self._records >= self.compact_every:
+            self._request_compaction()
+
+    def _request_compaction(self):
+        if self._writer_running:
+            self._compact_due = True
+            self._wake.set()
+        else:
+            self.compact()
+
+    def create_quote(self, quote):
+        return self.create_quotes([quote])[0]
+
+    def create_quotes(self, quotes):
+        """Number and store several quotes with one journal write; returns their quote numbers."""
+        counter = self.data['quote_counter']
+        records = []
+        for quote in quotes:
+            counter += 1
+            quote.quote_number = format_quote_number(counter)
+            records.append({'op': 'create', 'counter': counter, 'quote': quote.to_dict()})
+        # Indexed first: the write may compact straight away, and compaction indexes the quotes again
+        for quote in quotes:
+            self._by_user.setdefault(quote.user_id, []).append(quote.quote_number)
+        self._append(*records)
+        return [quote.quote_number for quote in quotes]
+
+    def get_quote(self, quote_number):
+        quote = self.data['quotes'].get(quote_number)
+        if quote is None and self._rest_offset is not None:
+            self._ensure_loaded()
+            quote = self.data['quotes'].get(quote_number)
+        if quote is None:
+            quote = self.archive.get(quote_number)
+        return quote
+
+    def update_quote(self, quote_number, expected_status=None, **fields):
+        quotes = self.update_quotes({quote_number: fields}, expected_status)
+        return quotes[0] if quotes else None
+
+    def update_quotes(self, updates, expected_status=None):
+        """Apply {quote_number: fields} with one journal write; returns the updated quotes.
+
+        With expected_status, quotes whose status differs are skipped. Archived quotes are
+        read-only and are skipped too.
+        """
+        if any(qn not in self.data['quotes'] for qn in updates):
+            self._ensure_loaded()
+        quotes = self.data['quotes']
+        updates = {
+            qn: fields for qn, fields in updates.items()
+            if qn in quotes and (expected_status is None or quotes[qn].status == expected_status)
+        }
+        if updates:
+            self._append(*({'op': 'update', 'quote_number': qn, 'fields': fields} for qn, fields in updates.items()))
+        return [self.data['quotes'][qn] for qn in updates if qn in self.data['quotes']]
+
+    def _user_quotes(self, user_id, status):
+        quotes = (self.data['quotes'][qn] for qn in reversed(self._by_user.get(user_id, ())))
+        if status is not None:
+            quotes = (q for q in quotes if q.status == status)
+        return quotes
+
+    def list_by_user(self, user_id, status=None, offset=0, limit=None):
+        """A user's quotes, newest first, optionally only those with the given status.
+
+        In-memory quotes come first; the archive is only read for pages past them.
+        """
+        self._ensure_loaded()
+        stop = None if limit is None else offset + limit
+        quotes = list(islice(self._user_quotes(user_id, status), offset, stop))
+        if limit is not None and len(quotes) == limit:
+            return quotes
+        archive_offset = max(0, offset - self._count_in_memory(user_id, status))
+        remaining = None if limit is None else limit - len(quotes)
+        return quotes + self.archive.list_by_user(user_id, status, archive_offset, remaining)
+
+    def _count_in_memory(self, user_id, status):
+        if status is None:
+            return len(self._by_user.get(user_id, ()))
+        return sum(1 for _ in self._user_quotes(user_id, status))
+
+    def count_by_user(self, user_id, status=None):
+        self._ensure_loaded()
+        return self._count_in_memory(user_id, status) + self.archive.count_by_user(user_id, status)
+
+    def iter_quotes(self, status=None, since=None, before=None):
+        """Quotes oldest first, optionally filtered by status and by created_at (since <= created_at < before)."""
+        # Here rather than in the generator, which may be consumed on another thread
+        self._ensure_loaded()
+        return self._iter_quotes(status, since, before)
+
+    def _iter_quotes(self, status, since, before):
+        yield from self.archive.iter_quotes(status, since, before)
+        # A copy of the quotes, so this can run in a thread while quotes are added or archived
+        for quote in list(self.data['quotes'].values()):
+            if status is not None and quote.status != status:
+                continue
+            created_at = quote.created_at or ''
+            if (since is not None and created_at < since) or (before is not None and created_at >= before):
+                continue
+            yield quote
+
+    def list_by_status(self, status):
+        if status != 'pending':
+            # Pending quotes are all loaded at startup
+            self._ensure_loaded()
+        archived = list(self.archive.iter_quotes(status)) if status in CLOSED_STATUSES else []
+        return archived + [q for q in self.data['quotes'].values() if q.status == status]
+
+    def list_open(self):
+        """Pending and approved quotes in memory; archived ones are long past their validity."""
+        self._ensure_loaded()
+        return [q for q in self.data['quotes'].values() if q.status in OPEN_STATUSES]
+
+    def get_stats(self):
+        # Held-back journal records still have to be counted
+        self._ensure_loaded()
+        return self.data['stats']
+
+    def rebuild_stats(self):
+        """Recompute the statistics from every quote, archive included, and save them.
+
+        Returns the number of cells that differed from the running totals.
+        """
+        stats = QuoteStats.from_quotes(self.iter_quotes())
+        differences = stats.differences(self.data['stats'])
+        self.data['stats'] = stats
+        self._request_compaction()
+        return differences
+
+    async def recompute_stats(self):
+        """rebuild_stats() with the scan of every quote and archive segment in a worker thread."""
+        self._ensure_loaded()
+        for _ in range(UPDATE_ATTEMPTS):
+            seen, months = self.data['stats'].copy(), self.archive.months
+            quotes = list(self.data['quotes'].values())
+            stats = await asyncio.to_thread(lambda: QuoteStats.from_quotes(chain(self.archive.iter_quotes(), quotes)))
+            # A quote that changed or was archived during the scan may be counted wrong; scan again
+            if self.archive.months is months and not self.data['stats'].differences(seen):
+                break
+        else:
+            raise RuntimeError("Quotes kept changing while the statistics were rebuilt")
+        self.data['stats'] = stats
+        self._request_compaction()
+        return stats.differences(seen)
+
+    def _snapshot(self):
+        self._ensure_loaded()
+        # Fresh dicts, so the JSON encoding can run in a thread while quotes keep changing
+        return {
+            'quote_counter': self.data['quote_counter'],
+            'quotes': {qn: quote.to_dict() for qn, quote in self.data['quotes'].items()},
+            'stats': self.data['stats'].to_list(),
+        }
+
+    def _write_snapshot(self, snapshot):
+        # Write the snapshot next to the old one and swap it in, so a crash leaves either
+        # the old snapshot plus the full journal(s) or the new snapshot; replay is idempotent.
+        tmp_file = self.data_file + '.tmp'
+        with metrics.timer('store_sync_seconds', kind='snapshot'):
+            quotes = snapshot['quotes'].values()
+            pending = [quote for quote in quotes if quote['status'] == 'pending']
+            header = {
+                'format': 2, 'quote_counter': snapshot['quote_counter'], 'stats': snapshot['stats'],
+                'pending': len(pending), 'quotes': len(quotes),
+            }
+            with open(tmp_file, 'w', encoding='utf-8') as f:
+                for item in [header, *pending, *(quote for quote in quotes if quote['status'] != 'pending')]:
+                    f.write(json.dumps(item, separators=(',', ':')) + '\n')
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(tmp_file, self.data_file)
+        if os.path.exists(self.rotated_journal_file):
+            os.remove(self.rotated_journal_file)
+
+    def compact(self):
+        """Rewrite the snapshot and empty the journal, blocking. Used when no writer task runs."""
+        self._ensure_loaded()
+        self._archive_closed_quotes()
+        self._write_snapshot(self._snapshot())
+        self._journal.close()
+        self._journal = open(self.journal_file, 'w', encoding='utf-8')
+        self._records = 0
+        self._synced = self._appended
+
+    async def _compact_in_background(self):
+        self._compact_due = False
+        if os.path.exists(self.rotated_journal_file):
+            # The last attempt failed before its snapshot replaced the old one; rotating again
+            # would overwrite records that are in no snapshot yet
+            self.compact()
+            return
+        self._ensure_loaded()
+        await self._archive_closed_quotes_in_thread()
+        # New records go to a fresh journal while the snapshot of everything before it is written
+        self._journal.close()
+        os.replace(self.journal_file, self.rotated_journal_file)
+        self._journal = open(self.journal_file, 'w', encoding='utf-8')
+        self._records = 0
+        appended = self._appended
+        await asyncio.to_thread(self._write_snapshot, self._snapshot())
+        self._synced = max(self._synced, appended)
+
+    async def flush(self):
+        """Make every change so far durable. Concurrent callers share one fsync."""
+        if self._flush_lock is None:
+            self._flush_lock = asyncio.Lock()
+        async with self._flush_lock:
+            if self._compact_due:
+                await self._compact_in_background()
+            appended = self._appended
+            if self._synced >= appended:
+                return
+            # A duplicate descriptor stays valid even if the journal is swapped meanwhile
+            fd = os.dup(self._journal.fileno())
+            try:
+                with metrics.timer('store_sync_seconds', kind='journal'):
+                    await asyncio.to_thread(os.fsync, fd)
+            finally:
+                os.close(fd)
+            self._synced = appended
+
+    async def run_writer(self, interval=SYNC_INTERVAL):
+        """Background task: fsync the journal every interval and compact when due, until stop_writer()."""
+        self._wake = asyncio.Event()
+        self._writer_running = True
+        try:
+            while True:
+                try:
+                    await asyncio.wait_for(self._wake.wait(), timeout=interval)
+                except asyncio.TimeoutError:
+                    pass
+                self._wake.clear()
+                try:
+                    await self.flush()
+                except OSError as e:
+                    print(f"Error syncing quote journal: {e}")
+                if self._closing:
+                    break
+        finally:
+            self._writer_running = False
+
+    def stop_writer(self):
+        """Make run_writer() do a last flush and return."""
+        self._closing = True
+        if self._wake is not None:
+            self._wake.set()
+
+    def close(self):
+        self._journal.close()
+        self._lock.close()
+        if self._rest_file is not None:
+            self._rest_file.close()
+
+
+class SqliteStore:
+    """Quote store backed by SQLite, with the same API as JournalStore.
+
+    Quotes are not kept in memory; lookups by quote number, user and status go through indexes.
+    The full quote is stored as JSON next to the indexed columns.
+
+    Several processes can share one database. Quote numbers come from blocks reserved on the
+    shared counter, and updates are compare-and-set on a per-quote version, so two workers can't
+    both move a quote out of 'pending' or overwrite each other's changes.
+
+    Running statistics live in the stats table and are adjusted in the same transaction as the
+    quote they come from.
+    """
+
+    def __init__(self, db_file=DB_FILE, block_size=QUOTE_BLOCK_SIZE):
+        self.db_file = db_file
+        self.block_size = block_size
+        # Reserved counters not used yet: next one and last one
+        self._block = (1, 0)
+        # Waits for another worker's write to finish instead of failing at once
+        self.conn = sqlite3.connect(db_file, timeout=SQLITE_BUSY_TIMEOUT)
+        self.conn.execute('PRAGMA journal_mode=WAL')
+        self.conn.execute('PRAGMA synchronous=NORMAL')
+        with self.conn:
+            has_stats = self.conn.execute(
+                "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'stats'"
+            ).fetchone() is not None
+            self.conn.executescript('''
+                CREATE TABLE IF NOT EXISTS quotes (
+                    quote_number TEXT PRIMARY KEY,
+                    counter INTEGER NOT NULL,
+                    user_id INTEGER NOT NULL,
+                    status TEXT NOT NULL,
+                    created_at TEXT,
+                    data TEXT NOT NULL,
+                    version INTEGER NOT NULL DEFAULT 0
+                );
+                CREATE INDEX IF NOT EXISTS idx_quotes_user ON quotes (user_id, counter);
+                CREATE INDEX IF NOT EXISTS idx_quotes_user_status ON quotes (user_id, status, counter);
+                CREATE INDEX IF NOT EXISTS idx_quotes_status ON quotes (status, counter);
+                CREATE INDEX IF NOT EXISTS idx_quotes_created ON quotes (created_at);
+                CREATE TABLE IF NOT EXISTS meta (
+                    key TEXT PRIMARY KEY,
+                    value INTEGER NOT NULL
+                );
+                INSERT OR IGNORE INTO meta (key, value) VALUES ('quote_counter', 100);
+                CREATE TABLE IF NOT EXISTS stats (
+                    dimension TEXT NOT NULL,
+                    key TEXT NOT NULL,
+                    status TEXT NOT NULL,
+                    count INTEGER NOT NULL,
+                    litres INTEGER NOT NULL,
+                    subtotal_cents INTEGER NOT NULL,
+                    total_cents INTEGER NOT NULL,
+                    approval_seconds INTEGER NOT NULL,
+                    PRIMARY KEY (dimension, key, status)
+                );
+            ''')
+            columns = [row[1] for row in self.conn.execute('PRAGMA table_info(quotes)')]
+            if 'version' not in columns:
+                self.conn.execute('ALTER TABLE quotes ADD COLUMN version INTEGER NOT NULL DEFAULT 0')
+        if not has_stats and not self.is_empty():
+            # Database from before statistics were kept
+            self.rebuild_stats()
+
+    def _insert(self, counter, quote):
+        self.conn.execute(
+            'INSERT INTO quotes (quote_number, counter, user_id, status, created_at, data) '
+            'VALUES (?, ?, ?, ?, ?, ?)',
+            (quote.quote_number, counter, quote.user_id, quote.status,
+             quote.created_at, json.dumps(quote.to_dict(), separators=(',', ':')))
+        )
+        self._add_stats(quote)
+
+    def _add_stats(self, quote, sign=1):
+        """Add (or with sign=-1 take away) a quote's contributions. Call inside a transaction."""
+        self.conn.executemany(
+            f'INSERT INTO stats (dimension, key, status, {", ".join(STAT_FIELDS)}) VALUES (?, ?, ?, ?, ?, ?, ?, ?) '
+            'ON CONFLICT (dimension, key, status) DO UPDATE SET '
+            + ', '.join(f'{field} = {field} + excluded.{field}' for field in STAT_FIELDS),
+            [(*cell, *(sign * value for value in values)) for cell, values in contributions(quote)]
+        )
+
+    def create_quote(self, quote):
+        return self.create_quotes([quote])[0]
+
+    def _reserve(self, count):
+        """First of count consecutive counters, and the block left afterwards. Call inside a transaction."""
+        start, end = self._block
+        if end - start + 1 < count:
+            # A batch always gets consecutive numbers; whatever was left of the old block is skipped
+            size = max(count, self.block_size)
+            self.conn.execute("UPDATE meta SET value = value + ? WHERE key = 'quote_counter'", (size,))
+            end = self.conn.execute("SELECT value FROM meta WHERE key = 'quote_counter'").fetchone()[0]
+            start = end - size + 1
+        return start, (start + count, end)
+
+    def create_quotes(self, quotes):
+        """Number and store several quotes in one transaction; returns their quote numbers."""
+        with metrics.timer('store_write_seconds', backend='sqlite'), self.conn:
+            first, block = self._reserve(len(quotes))
+            for counter, quote in enumerate(quotes, first):
+                quote.quote_number = format_quote_number(counter)
+                self._insert(counter, quote)
+        # Only once committed: a rolled-back reservation must not be handed out later
+        self._block = block
+        return [quote.quote_number for quote in quotes]
+
+    def get_quote(self, quote_number):
+        row = self.conn.execute('SELECT data FROM quotes WHERE quote_number = ?', (quote_number,)).fetchone()
+        return Quote.from_dict(json.loads(row[0])) if row else None
+
+    def update_quote(self, quote_number, expected_status=None, **fields):
+        quotes = self.update_quotes({quote_number: fields}, expected_status)
+        return quotes[0] if quotes else None
+
+    def update_quotes(self, updates, expected_status=None):
+        """Apply {quote_number: fields} in one transaction; returns the updated quotes.
+
+        With expected_status, quotes whose status differs are skipped. Each write only succeeds
+        if the quote's version is still the one that was read; otherwise it is read again and
+        the check repeated.
+        """
+        quotes = []
+        with metrics.timer('store_write_seconds', backend='sqlite'), self.conn:
+            for quote_number, fields in updates.items():
+                for _ in range(UPDATE_ATTEMPTS):
+                    row = self.conn.execute(
+                        'SELECT data, version FROM quotes WHERE quote_number = ?', (quote_number,)
+                    ).fetchone()
+                    if row is None:
+                        break
+                    old = Quote.from_dict(json.loads(row[0]))
+                    if expected_status is not None and old.status != expected_status:
+                        break
+                    quote = Quote.from_dict(json.loads(row[0]))
+                    quote.update(**fields)
+                    cursor = self.conn.execute(
+                        'UPDATE quotes SET status = ?, data = ?, version = version + 1 '
+                        'WHERE quote_number = ? AND version = ?',
+                        (quote.status, json.dumps(quote.to_dict(), separators=(',', ':')), quote_number, row[1])
+                    )
+                    if cursor.rowcount:
+                        self._add_stats(old, -1)
+                        self._add_stats(quote)
+                        quotes.append(quote)
+                        break
+                else:
+                    raise RuntimeError(f"Could not update {quote_number}: it kept changing")
+        return quotes
+
+    def list_by_user(self, user_id, status=None, offset=0, limit=None):
+        """A user's quotes, newest first, optionally only those with the given status."""
+        sql, params = 'SELECT data FROM quotes WHERE user_id = ?', [user_id]
+        if status is not None:
+            sql += ' AND status = ?'
+            params.append(status)
+        sql += ' ORDER BY counter DESC LIMIT ? OFFSET ?'
+        params += [-1 if limit is None else limit, offset]
+        return [Quote.from_dict(json.loads(row[0])) for row in self.conn.execute(sql, params)]
+
+    def count_by_user(self, user_id, status=None):
+        if status is None:
+            row = self.conn.execute('SELECT COUNT(*) FROM quotes WHERE user_id = ?', (user_id,)).fetchone()
+        else:
+            row = self.conn.execute('SELECT COUNT(*) FROM quotes WHERE user_id = ? AND status = ?', (user_id, status)).fetchone()
+        return row[0]
+
+    def iter_quotes(self, status=None, since=None, before=None):
+        """Quotes oldest first, optionally filtered by status and by created_at (since <= created_at < before)."""
+        sql, params = 'SELECT data FROM quotes WHERE 1 = 1', []
+        if status is not None:
+            sql += ' AND status = ?'
+            params.append(status)
+        if since is not None:
+            sql += ' AND created_at >= ?'
+            params.append(since)
+        if before is not None:
+            sql += ' AND created_at < ?'
+            params.append(before)
+        # Own connection: rows are fetched lazily, possibly from another thread
+        conn = sqlite3.connect(self.db_file)
+        try:
+            for row in conn.execute(sql + ' ORDER BY counter', params):
+                yield Quote.from_dict(json.loads(row[0]))
+        finally:
+            conn.close()
+
+    def list_by_status(self, status):
+        rows = self.conn.execute('SELECT data FROM quotes WHERE status = ? ORDER BY counter', (status,))
+        return [Quote.from_dict(json.loads(row[0])) for row in rows]
+
+    def list_open(self):
+        """Pending and approved quotes."""
+        placeholders = ', '.join('?' * len(OPEN_STATUSES))
+        rows = self.conn.execute(f'SELECT data FROM quotes WHERE status IN ({placeholders}) ORDER BY counter', OPEN_STATUSES)
+        return [Quote.from_dict(json.loads(row[0])) for row in rows]
+
+    def get_stats(self):
+        return QuoteStats.from_list(self.conn.execute(f'SELECT dimension, key, status, {", ".join(STAT_FIELDS)} FROM stats'))
+
+    def rebuild_stats(self):
+        """Recompute the stats table from every quote; returns the number of cells that differed."""
+        old = self.get_stats()
+        with self.conn:
+            # The DELETE takes the write lock first, so no other worker changes quotes meanwhile
+            self.conn.execute('DELETE FROM stats')
+            for row in self.conn.execute('SELECT data FROM quotes'):
+                self._add_stats(Quote.from_dict(json.loads(row[0])))
+        return self.get_stats().differences(old)
+
+    def _scan_stats(self):
+        """(stats table, statistics recomputed from the quotes), from one read snapshot on a connection of its own."""
+        conn = sqlite3.connect(self.db_file, isolation_level=None)
+        try:
+            conn.execute('BEGIN')
+            seen = QuoteStats.from_list(conn.execute(f'SELECT dimension, key, status, {", ".join(STAT_FIELDS)} FROM stats'))
+            stats = QuoteStats.from_quotes(Quote.from_dict(json.loads(row[0])) for row in conn.execute('SELECT data FROM quotes'))
+            conn.execute('COMMIT')
+        finally:
+            conn.close()
+        return seen, stats
+
+    async def recompute_stats(self):
+        """rebuild_stats() with the scan in a worker thread; only swapping the result in takes the write lock."""
+        for _ in range(UPDATE_ATTEMPTS):
+            seen, stats = await asyncio.to_thread(self._scan_stats)
+            with self.conn:
+                # A no-op write takes the write lock, so nothing changes between the check and the swap
+                self.conn.execute("UPDATE meta SET value = value WHERE key = 'quote_counter'")
+                # Quotes written since the snapshot have moved the totals on; scan again
+                if self.get_stats().differences(seen):
+                    continue
+                self.conn.execute('DELETE FROM stats')
+                self.conn.executemany(
+                    f'INSERT INTO stats (dimension, key, status, {", ".join(STAT_FIELDS)}) VALUES (?, ?, ?, ?, ?, ?, ?, ?)',
+                    stats.to_list()
+                )
+                return stats.differences(seen)
+        raise RuntimeError("Quotes kept changing while the statistics were rebuilt")
+
+    def _checkpoint(self):
+        conn = sqlite3.connect(self.db_file, timeout=30)
+        try:
+            with metrics.timer('store_sync_seconds', kind='checkpoint'):
+                conn.execute('PRAGMA wal_checkpoint(PASSIVE)')
+        finally:
+            conn.close()
+
+    async def flush(self):
+        """Make every committed change durable.
+
+        With synchronous=NORMAL a commit is safe from a crash of the bot but not from power loss
+        until the WAL is checkpointed, which this does off the event loop.
+        """
+        await asyncio.to_thread(self._checkpoint)
+
+    async def load_remaining(self):
+        # Nothing is loaded up front
+        pass
+
+    async def run_writer(self, interval=SYNC_INTERVAL):
+        # SQLite writes and checkpoints on its own; nothing to do in the background
+        pass
+
+    def stop_writer(self):
+        pass
+
+    def is_empty(self):
+        return self.conn.execute('SELECT 1 FROM quotes LIMIT 1').fetchone() is None
+
+    def import_json(self, data_file=DATA_FILE, journal_file=JOURNAL_FILE):
+        """Import quotes from bot_data.json (and its journal) into this database."""
+        journal = JournalStore(data_file, journal_file, compact_every=float('inf'), archive_after_days=0)
+        count = 0
+        try:
+            with self.conn:
+                # Archived quotes included
+                for quote in journal.iter_quotes():
+                    self._insert(quote_counter(quote.quote_number), quote)
+                    count += 1
+                self.conn.execute(
+                    "UPDATE meta SET value = MAX(value, ?) WHERE key = 'quote_counter'",
+                    (journal.data['quote_counter'],)
+                )
+        finally:
+            journal.close()
+        return count
+
+    def close(self):
+        self.conn.close()
+
+
+def open_store(backend='json'):
+    if backend == 'sqlite':
+        migrate = not os.path.exists(DB_FILE)
+        store = SqliteStore()
+        if migrate and (os.path.exists(DATA_FILE) or os.path.exists(JOURNAL_FILE)):
+            count = store.import_json()
+            print(f"Imported {count} quotes from {DATA_FILE} into {DB_FILE}")
+        return store
+    return JournalStore()
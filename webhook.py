@@ -0,0 +1,154 @@
+import hmac
+import json
+import signal
+import asyncio
+from telegram import Update
+
+# Telegram updates are small; anything bigger is not from Telegram
+MAX_BODY_BYTES = 1024 * 1024
+
+REASONS = {200: 'OK', 400: 'Bad Request', 403: 'Forbidden', 404: 'Not Found', 405: 'Method Not Allowed', 413: 'Payload Too Large'}
+
+
+class Request:
+    def __init__(self, method, path, headers, body):
+        self.method = method
+        self.path = path
+        self.headers = headers
+        self.body = body
+
+
+async def _read_request(reader):
+    request_line = await reader.readline()
+    if not request_line:
+        return None
+    method, target, _ = request_line.decode('latin-1').split(' ', 2)
+    headers = {}
+    while True:
+        line = await reader.readline()
+        if line in (b'\r\n', b'\n', b''):
+            break
+        name, _, value = line.decode('latin-1').partition(':')
+        headers[name.strip().lower()] = value.strip()
+    length = int(headers.get('content-length', 0))
+    if length > MAX_BODY_BYTES:
+        return Request(method, target.split('?', 1)[0], headers, None)
+    body = await reader.readexactly(length) if length else b''
+    return Request(method, target.split('?', 1)[0], headers, body)
+
+
+async def serve_http(routes, host, port):
+    """Minimal HTTP/1.1 server on asyncio streams.
+
+    routes maps (method, path) to a coroutine taking a Request and returning
+    (status, content_type, body bytes). One request per connection.
+    """
+    async def handle_connection(reader, writer):
+        try:
+            request = await _read_request(reader)
+            if request is None:
+                return
+            if request.body is None:
+                status, content_type, body = 413, 'text/plain', b'payload too large'
+            elif (request.method, request.path) in routes:
+                status, content_type, body = await routes[(request.method, request.path)](request)
+            elif any(path == request.path for _, path in routes):
+                status, content_type, body = 405, 'text/plain', b'method not allowed'
+            else:
+                status, content_type, body = 404, 'text/plain', b'not found'
+            writer.write(
+                f"HTTP/1.1 {status} {REASONS.get(status, '')}\r\n"
+                f"Content-Type: {content_type}\r\n"
+                f"Content-Length: {len(body)}\r\n"
+                f"Connection: close\r\n\r\n".encode('latin-1') + body
+            )
+            await writer.drain()
+        except (ValueError, asyncio.IncompleteReadError, ConnectionError) as e:
+            print(f"Bad HTTP request: {e}")
+        finally:
+            writer.close()
+
+    return await asyncio.start_server(handle_connection, host, port)
+
+
+def secret_matches(request, secret_token):
+    # Bytes, since compare_digest rejects non-ASCII str; headers were decoded as latin-1
+    return not secret_token or hmac.compare_digest(
+        request.headers.get('x-telegram-bot-api-secret-token', '').encode('latin-1'), secret_token.encode())
+
+
+def webhook_routes(application, url_path, secret_token=None):
+    async def receive_update(request):
+        if not secret_matches(request, secret_token):
+            return 403, 'text/plain', b'forbidden'
+        try:
+            update = Update.de_json(json.loads(request.body), application.bot)
+        except (ValueError, KeyError, TypeError) as e:
+            print(f"Rejected webhook payload: {e}")
+            return 400, 'text/plain', b'bad update'
+        # Acknowledge at once; the application works through the queue on its own
+        await application.update_queue.put(update)
+        return 200, 'text/plain', b'ok'
+
+    async def health(request):
+        body = json.dumps({'status': 'ok' if application.running else 'stopping', 'queued_updates': application.update_queue.qsize()})
+        return 200, 'application/json', body.encode()
+
+    return {
+        ('POST', url_path): receive_update,
+        ('GET', '/health'): health,
+    }
+
+
+def stop_on_signals():
+    """An event that is set on SIGINT or SIGTERM."""
+    stop = asyncio.Event()
+    loop = asyncio.get_running_loop()
+    for sig in (signal.SIGINT, signal.SIGTERM):
+        loop.add_signal_handler(sig, stop.set)
+    return stop
+
+
+async def start_application(application):
+    """What run_polling does before polling: initialize, post_init, start."""
+    await application.initialize()
+    if application.post_init:
+        await application.post_init(application)
+    await application.start()
+
+
+async def stop_application(application):
+    """Finish the updates already queued, then shut down with the post_* hooks."""
+    await application.stop()
+    if application.post_stop:
+        await application.post_stop(application)
+    await application.shutdown()
+    if application.post_shutdown:
+        await application.post_shutdown(application)
+
+
+async def set_webhook(bot, webhook_url, secret_token=None):
+    await bot.set_webhook(url=webhook_url, secret_token=secret_token, allowed_updates=Update.ALL_TYPES)
+    print(f"🔗 Webhook registered at {webhook_url}")
+
+
+async def run_webhook(application, host, port, url_path, secret_token=None, webhook_url=None):
+    """Serve updates over HTTP until SIGINT/SIGTERM, then drain the queue and shut down.
+
+    Telegram is only told about the webhook when webhook_url is given, so a local instance can
+    be fed recorded updates with curl.
+    """
+    stop = stop_on_signals()
+    await start_application(application)
+    server = await serve_http(webhook_routes(application, url_path, secret_token), host, port)
+    print(f"🌐 Webhook listening on {host}:{port}{url_path}")
+    if webhook_url:
+        await set_webhook(application.bot, webhook_url, secret_token)
+    try:
+        await stop.wait()
+    finally:
+        print("Shutting down webhook server...")
+        # Stop taking updates, then let the application finish the ones already queued
+        server.close()
+        await server.wait_closed()
+        await stop_application(application)
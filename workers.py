@@ -0,0 +1,103 @@
+import json
+import signal
+import asyncio
+import multiprocessing
+from telegram import Update
+from webhook import secret_matches, serve_http, set_webhook, start_application, stop_application, stop_on_signals
+
+
+def update_shard(update, workers):
+    """Worker index for a raw update, by the user it comes from, so each conversation stays on one worker."""
+    for value in update.values():
+        if isinstance(value, dict):
+            sender = value.get('from') or value.get('user')
+            if sender:
+                return sender['id'] % workers
+            chat = value.get('chat')
+            if chat:
+                return chat['id'] % workers
+    return update['update_id'] % workers
+
+
+def _worker_main(build_application, index, updates):
+    # The supervisor handles signals and stops workers through their queue, after the HTTP
+    # server has stopped taking updates, so nothing accepted is dropped
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    signal.signal(signal.SIGTERM, signal.SIG_IGN)
+    asyncio.run(_run_worker(build_application(worker=index), updates))
+
+
+async def _run_worker(application, updates):
+    loop = asyncio.get_running_loop()
+    await start_application(application)
+    try:
+        while True:
+            body = await loop.run_in_executor(None, updates.get)
+            if body is None:
+                break
+            await application.update_queue.put(Update.de_json(json.loads(body), application.bot))
+    finally:
+        await stop_application(application)
+
+
+async def run_workers(build_application, workers, bot, host, port, url_path, secret_token=None, webhook_url=None):
+    """Receive webhooks in this process and hand each update to one of several worker processes.
+
+    Every worker runs its own Application built by build_application(worker=index). Updates are
+    routed by user, so a user's conversation state only ever lives in one worker. Workers that
+    die are restarted; updates queued for them wait for the replacement.
+    """
+    context = multiprocessing.get_context('spawn')
+    queues = [context.Queue() for _ in range(workers)]
+    processes = [None] * workers
+
+    def start_worker(index):
+        processes[index] = context.Process(
+            target=_worker_main, args=(build_application, index, queues[index]), name=f'bot-worker-{index}'
+        )
+        processes[index].start()
+
+    for index in range(workers):
+        start_worker(index)
+
+    async def receive_update(request):
+        if not secret_matches(request, secret_token):
+            return 403, 'text/plain', b'forbidden'
+        try:
+            shard = update_shard(json.loads(request.body), workers)
+        except (ValueError, KeyError, TypeError, AttributeError) as e:
+            print(f"Rejected webhook payload: {e}")
+            return 400, 'text/plain', b'bad update'
+        queues[shard].put(request.body)
+        return 200, 'text/plain', b'ok'
+
+    async def health(request):
+        alive = [process.is_alive() for process in processes]
+        body = json.dumps({'status': 'ok' if all(alive) else 'degraded', 'workers': alive})
+        return 200, 'application/json', body.encode()
+
+    stop = stop_on_signals()
+    server = await serve_http({('POST', url_path): receive_update, ('GET', '/health'): health}, host, port)
+    print(f"🌐 Webhook listening on {host}:{port}{url_path} with {workers} workers")
+    if webhook_url:
+        async with bot:
+            await set_webhook(bot, webhook_url, secret_token)
+    try:
+        while not stop.is_set():
+            for index, process in enumerate(processes):
+                if not process.is_alive():
+                    print(f"Worker {index} exited with code {process.exitcode}, restarting it")
+                    start_worker(index)
+            try:
+                await asyncio.wait_for(stop.wait(), timeout=1)
+            except asyncio.TimeoutError:
+                pass
+    finally:
+        print("Shutting down webhook server and workers...")
+        server.close()
+        await server.wait_closed()
+        for queue in queues:
+            queue.put(None)
+        loop = asyncio.get_running_loop()
+        for process in processes:
+            await loop.run_in_executor(None, process.join)